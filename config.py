@@ -7,11 +7,104 @@ ORACLE_USER = os.getenv("ORACLE_USER")
 ORACLE_PWD  = os.getenv("ORACLE_PWD")
 ORACLE_DSN  = os.getenv("ORACLE_DSN")
 
+# pool de sessões Oracle (compartilhado pela API e pelo subscriber)
+ORACLE_POOL_MIN        = int(os.getenv("ORACLE_POOL_MIN", "2"))
+ORACLE_POOL_MAX        = int(os.getenv("ORACLE_POOL_MAX", "10"))
+ORACLE_POOL_INCREMENT  = int(os.getenv("ORACLE_POOL_INCREMENT", "1"))
+ORACLE_POOL_TIMEOUT_MS = int(os.getenv("ORACLE_POOL_TIMEOUT_MS", "5000"))  # espera máx. no acquire
+ORACLE_POOL_PING_S     = int(os.getenv("ORACLE_POOL_PING_S", "60"))        # health check da sessão
+
+# circuit breaker do Oracle: abre após N falhas seguidas, testa de novo após X s
+ORACLE_BREAKER_FAILURES = int(os.getenv("ORACLE_BREAKER_FAILURES", "3"))
+ORACLE_BREAKER_RESET_S  = float(os.getenv("ORACLE_BREAKER_RESET_S", "30"))
+
+# geração de IDs: sequence (hi/lo) | identity | max (legado)
+ORACLE_ID_STRATEGY = os.getenv("ORACLE_ID_STRATEGY", "sequence")
+ORACLE_ID_BLOCK    = int(os.getenv("ORACLE_ID_BLOCK", "50"))  # = INCREMENT BY das sequences
+
+# modo de I/O das rotas: sync (threadpool do FastAPI) | async (executor dedicado ao Oracle)
+API_IO_MODE         = os.getenv("API_IO_MODE", "sync").lower()
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(ORACLE_POOL_MAX)))
+
+# ingestão em lote (POST /telemetria/batch)
+TELEMETRY_BATCH_MAX = int(os.getenv("TELEMETRY_BATCH_MAX", "5000"))
+
+# backend em arquivo da telemetria: csv (data/telemetria.csv) | binary (data/telemetria_bin/*.bin, requer numpy)
+TELEMETRY_FILE_BACKEND = os.getenv("TELEMETRY_FILE_BACKEND", "csv").lower()
+
+# rollup de 1 minuto da telemetria no Oracle (sql/telemetria_rollup.sql), mantido a cada INSERT
+TELEMETRY_ROLLUP = os.getenv("TELEMETRY_ROLLUP", "0") == "1"
+
+# detecções de visão: lote por quadro (POST /deteccoes/batch, MQTT) e filtro de ruído
+DETECTION_BATCH_MAX         = int(os.getenv("DETECTION_BATCH_MAX", "1000"))      # caixas por quadro
+DETECTION_MIN_CONF          = float(os.getenv("DETECTION_MIN_CONF", "0"))        # confiança mínima (0 = tudo)
+DETECTION_LABELS            = os.getenv("DETECTION_LABELS", "")                  # "moto,capacete" (vazio = todas)
+DETECTION_MIN_CONF_BY_LABEL = os.getenv("DETECTION_MIN_CONF_BY_LABEL", "")       # "capacete:0.6,pessoa:0.8"
+
+# posição das motos a partir das detecções (services/spatial_index.py, GET /motos/{id}/location)
+LOCATION_LABELS      = os.getenv("LOCATION_LABELS", "moto")              # classes que marcam posição (vazio = todas)
+LOCATION_CELL_PX     = float(os.getenv("LOCATION_CELL_PX", "64"))        # lado da célula da grade
+LOCATION_MAX_DIST_PX = float(os.getenv("LOCATION_MAX_DIST_PX", "120"))   # distância máx. para associar caixa sem id
+LOCATION_TTL_S       = float(os.getenv("LOCATION_TTL_S", "30"))          # posição mais velha não recebe associação
+
+# replay do spool (CSVs de fallback → Oracle quando ele voltar)
+SPOOL_REPLAY_BATCH      = int(os.getenv("SPOOL_REPLAY_BATCH", "500"))
+SPOOL_REPLAY_RATE       = float(os.getenv("SPOOL_REPLAY_RATE", "2000"))   # linhas/s, 0 = sem limite
+SPOOL_REPLAY_INTERVAL_S = float(os.getenv("SPOOL_REPLAY_INTERVAL_S", "10"))
+SPOOL_REPLAY_ENABLED    = os.getenv("SPOOL_REPLAY_ENABLED", "1") == "1"
+
+# limites da classificação de status da frota (API /fleet/status e dashboard)
+FLEET_BATT_MIN = float(os.getenv("FLEET_BATT_MIN", "25"))    # bateria abaixo → manutenção
+FLEET_TEMP_MAX = float(os.getenv("FLEET_TEMP_MAX", "60"))    # temperatura acima → manutenção
+FLEET_VIB_USE  = float(os.getenv("FLEET_VIB_USE", "1.0"))    # vibração acima → em uso
+
+# detecção de anomalias na ingestão (services/anomaly.py)
+ANOMALY_ENABLED           = os.getenv("ANOMALY_ENABLED", "1") == "1"
+ANOMALY_ALPHA             = float(os.getenv("ANOMALY_ALPHA", "0.1"))      # peso da EWMA
+ANOMALY_Z                 = float(os.getenv("ANOMALY_Z", "4.0"))          # z-score que dispara alerta
+ANOMALY_WARMUP            = int(os.getenv("ANOMALY_WARMUP", "10"))        # leituras antes de usar z-score
+ANOMALY_BATT_DROP_PCT_MIN = float(os.getenv("ANOMALY_BATT_DROP_PCT_MIN", "2.0"))
+ANOMALY_COOLDOWN_S        = float(os.getenv("ANOMALY_COOLDOWN_S", "300"))
+# comandos automáticos por tipo de alerta, ex.: "temp_alta:lock,bateria_drenando:horn" (vazio = só alerta)
+ANOMALY_ACTIONS           = os.getenv("ANOMALY_ACTIONS", "")
+
+# estado da frota para o dashboard (segue data/telemetria.csv a cada N segundos)
+FLEET_FOLLOW_INTERVAL_S = float(os.getenv("FLEET_FOLLOW_INTERVAL_S", "2.0"))
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "60"))   # cards por página de zona
+AREAS_CACHE_TTL_S = float(os.getenv("AREAS_CACHE_TTL_S", "60"))      # cache das áreas (T_IOT_AREA)
+MOTOS_CACHE_TTL_S = float(os.getenv("MOTOS_CACHE_TTL_S", "30"))      # cache de GET /motos
+MOTOS_BULK_MAX = int(os.getenv("MOTOS_BULK_MAX", "5000"))            # motos por POST/PUT /motos/bulk
+DASHBOARD_PUSH_INTERVAL_S = float(os.getenv("DASHBOARD_PUSH_INTERVAL_S", "1.0"))  # push SSE das mudanças
+
+# leitura de QR Code: worker headless da câmera (services/qr_worker.py) e upload de imagem
+QR_CAMERA_ENABLED = os.getenv("QR_CAMERA_ENABLED", "0") == "1"   # liga o worker da câmera na API
+QR_CAMERA_SOURCE  = os.getenv("QR_CAMERA_SOURCE", "0")           # índice da câmera, arquivo ou URL (rtsp://...)
+QR_SCAN_FPS       = float(os.getenv("QR_SCAN_FPS", "5"))         # quadros decodificados por segundo
+QR_SCAN_SCALE     = float(os.getenv("QR_SCAN_SCALE", "0.5"))     # redução do quadro antes do pyzbar
+QR_SCAN_ROI       = os.getenv("QR_SCAN_ROI", "")                 # "x,y,w,h" em fração do quadro (vazio = inteiro)
+QR_QUEUE_MAX      = int(os.getenv("QR_QUEUE_MAX", "100"))        # eventos de QR aguardando cadastro
+QR_DEDUPE_S       = float(os.getenv("QR_DEDUPE_S", "10"))        # mesmo QR não gera evento de novo antes disso
+QR_DECODE_THREADS = int(os.getenv("QR_DECODE_THREADS", "2"))     # threads de decode do worker da câmera
+QR_UPLOAD_MAX_BYTES = int(os.getenv("QR_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+QR_BATCH_MAX_FILES  = int(os.getenv("QR_BATCH_MAX_FILES", "500"))   # imagens por POST /motos/qrcode/batch (zip expandido)
+QR_BATCH_MAX_BYTES  = int(os.getenv("QR_BATCH_MAX_BYTES", str(200 * 1024 * 1024)))  # total do lote (zip descompactado)
+QR_DECODE_WORKERS   = int(os.getenv("QR_DECODE_WORKERS", str(os.cpu_count() or 2)))  # processos de decode
+
 MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 MQTT_PORT   = int(os.getenv("MQTT_PORT", "1883"))
 MQTT_USERNAME = os.getenv("MQTT_USERNAME") or None
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD") or None
 
+# publisher MQTT persistente (POST /commands)
+MQTT_PUB_QOS       = int(os.getenv("MQTT_PUB_QOS", "1"))
+MQTT_PUB_QUEUE_MAX = int(os.getenv("MQTT_PUB_QUEUE_MAX", "10000"))
+
+# buffer write-behind do subscriber (fila limitada + flush por tamanho/tempo)
+MQTT_BUFFER_MAX           = int(os.getenv("MQTT_BUFFER_MAX", "10000"))
+MQTT_FLUSH_ROWS           = int(os.getenv("MQTT_FLUSH_ROWS", "500"))
+MQTT_FLUSH_INTERVAL_S     = float(os.getenv("MQTT_FLUSH_INTERVAL_S", "1.0"))
+MQTT_BUFFER_PUT_TIMEOUT_S = float(os.getenv("MQTT_BUFFER_PUT_TIMEOUT_S", "0"))  # 0 = descarta na hora
+
 def validate_env():
     missing = [k for k,v in {
         "ORACLE_USER": ORACLE_USER,
@@ -1,34 +1,244 @@
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
 import cv2
-from pyzbar.pyzbar import decode
+import numpy as np
+from pyzbar.pyzbar import decode, ZBarSymbol
+
+# -------------------------------------------------------
+# Leitura de QR Code (funções compartilhadas pela API e pelo worker de câmera)
+#
+# O QR de cadastro traz um JSON {"placa", "modelo", "area"}. Antes do pyzbar o
+# quadro vira tons de cinza, é recortado na ROI e reduzido: o zbar gasta bem
+# menos num quadro menor e o QR na frente da câmera continua legível.
+# -------------------------------------------------------
+QR_SYMBOLS = [ZBarSymbol.QRCODE]
+
+Roi = Tuple[float, float, float, float]   # x, y, largura, altura em fração do quadro (0..1)
+
+
+def parse_roi(spec: str) -> Optional[Roi]:
+    """"0.25,0.25,0.5,0.5" → (0.25, 0.25, 0.5, 0.5); vazio → None (quadro inteiro)."""
+    if not spec or not spec.strip():
+        return None
+    x, y, w, h = (float(v) for v in spec.split(","))
+    return x, y, w, h
+
+
+def preparar_frame(frame: np.ndarray, scale: float = 1.0, roi: Optional[Roi] = None) -> np.ndarray:
+    """Recorta a ROI, converte para cinza e reduz a escala (scale < 1)."""
+    if roi:
+        h, w = frame.shape[:2]
+        x, y, rw, rh = roi
+        frame = frame[int(y * h):int((y + rh) * h), int(x * w):int((x + rw) * w)]
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if 0 < scale < 1.0:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def decodificar_frame(frame: np.ndarray, scale: float = 1.0, roi: Optional[Roi] = None) -> List[str]:
+    """Conteúdo de todos os QR Codes do quadro."""
+    return [c.data.decode("utf-8", "replace")
+            for c in decode(preparar_frame(frame, scale, roi), symbols=QR_SYMBOLS)]
+
 
-def leitor_qrcode():
-    cap = cv2.VideoCapture(0)
+def decodificar_imagem(dados: bytes, scale: float = 1.0) -> List[str]:
+    """Decodifica uma imagem enviada (PNG/JPEG/...). ValueError se não for imagem."""
+    frame = cv2.imdecode(np.frombuffer(dados, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if frame is None:
+        raise ValueError("arquivo não é uma imagem válida")
+    codigos = decodificar_frame(frame, scale)
+    if not codigos and scale < 1.0:
+        codigos = decodificar_frame(frame)   # QR pequeno na foto: tenta na resolução original
+    return codigos
 
-    if not cap.isOpened():
-        print("❌ Não foi possível acessar a câmera")
-        return
 
-    while True:
-        ret, frame = cap.read()
+def decodificar_arquivo(arquivo: Tuple[str, bytes], scale: float = 1.0) -> dict:
+    """(nome, bytes) → {"arquivo", "codigos"} ou {"arquivo", "erro"}. Roda nos processos de
+    services/qr_pool.py, então não levanta exceção: o erro volta no resultado."""
+    nome, dados = arquivo
+    try:
+        return {"arquivo": nome, "codigos": decodificar_imagem(dados, scale)}
+    except Exception as e:
+        return {"arquivo": nome, "erro": str(e)}
 
-        if not ret:
-            continue
 
-        for codigo in decode(frame):
-            dados = codigo.data.decode('utf-8')
-            print(f'QR Code detectado: {dados}')
+def parse_moto(dados: str) -> dict:
+    """JSON do QR de cadastro → {"placa", "modelo", "area"}. Exceção se mal formatado."""
+    d = json.loads(dados)
+    return {"placa": str(d["placa"]), "modelo": str(d["modelo"]), "area": int(d["area"])}
+
+
+# -------------------------------------------------------
+# Pipeline contínuo: captura → fila limitada de quadros → workers de decode
+#
+# A thread de captura lê todos os quadros, mas só enfileira 1 a cada `skip`.
+# Se a fila enche (decode mais lento que a câmera), o quadro é descartado e o
+# skip sobe; quando a fila esvazia, o skip volta a cair. Assim a latência fica
+# limitada ao tamanho da fila em vez de crescer sem fim. Os workers são threads:
+# cv2 e o zbar (via ctypes) liberam o GIL durante o trabalho pesado.
+# Cada quadro pode ter vários QRs; um mesmo conteúdo só é reportado de novo
+# depois de `dedupe_s` segundos.
+#
+# Fonte de arquivo (vídeo gravado): por padrão nada é descartado, todos os
+# quadros são decodificados, e o resumo final dá o FPS para benchmark.
+# -------------------------------------------------------
+def _fonte(spec: str) -> Union[int, str]:
+    """"0" → índice da câmera; qualquer outra coisa → arquivo/URL (ex.: rtsp://...)."""
+    return int(spec) if str(spec).strip().isdigit() else spec
+
+
+class QrPipeline:
+    def __init__(self, source: Union[int, str] = 0, workers: int = 2, scale: float = 1.0,
+                 roi: Optional[Roi] = None, queue_max: int = 4, dedupe_s: float = 10.0,
+                 max_fps: float = 0.0, max_skip: int = 8, realtime: Optional[bool] = None,
+                 vistos: Optional[Dict[str, float]] = None,
+                 on_code: Optional[Callable[[str, float, int], None]] = None):
+        self.source = _fonte(source)
+        self.workers = max(1, workers)
+        self.scale, self.roi = scale, roi
+        self.dedupe_s = dedupe_s
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.max_skip = max(1, max_skip)
+        # câmera/stream: descarta quadros para acompanhar; arquivo: decodifica todos
+        self.realtime = (not isinstance(self.source, str) or "://" in self.source) if realtime is None else realtime
+        self.on_code = on_code or (lambda dados, ts, idx: print(f"QR Code detectado: {dados}"))
+        self.frames: "queue.Queue" = queue.Queue(maxsize=max(1, queue_max))
+        self.skip = 1
+        self._vistos: Dict[str, float] = {} if vistos is None else vistos   # QR → última vez reportado
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.m = {"frames_read": 0, "frames_decoded": 0, "frames_dropped": 0, "codes": 0,
+                  "unique_codes": 0, "duplicates": 0, "elapsed_s": 0.0, "read_fps": 0.0, "decode_fps": 0.0}
+
+    def stop(self):
+        self._stop.set()
+
+    # ---- workers ----
+    def _decodificar(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            idx, ts, frame = item
+            codigos = decodificar_frame(frame, self.scale, self.roi)
+            with self._lock:
+                self.m["frames_decoded"] += 1
+                self.m["codes"] += len(codigos)
+                novos = []
+                for dados in dict.fromkeys(codigos):   # o mesmo QR duas vezes no quadro conta uma
+                    if ts - self._vistos.get(dados, float("-inf")) < self.dedupe_s:
+                        self.m["duplicates"] += 1
+                        continue
+                    self._vistos[dados] = ts
+                    novos.append(dados)
+                if len(self._vistos) > 1024:   # esquece o que já saiu da janela
+                    for k in [k for k, t in self._vistos.items() if ts - t >= self.dedupe_s]:
+                        del self._vistos[k]
+                self.m["unique_codes"] += len(novos)
+            for dados in novos:
+                try:
+                    self.on_code(dados, ts, idx)
+                except Exception as e:
+                    print("⚠️ Falha ao tratar QR:", e)
+
+    # ---- captura ----
+    def _enfileirar(self, item) -> bool:
+        if not self.realtime:
+            self.frames.put(item)   # arquivo: espera o decode, não perde quadro
+            return True
+        try:
+            self.frames.put_nowait(item)
+        except queue.Full:
+            self.m["frames_dropped"] += 1
+            self.skip = min(self.max_skip, self.skip + 1)
+            return False
+        if self.frames.qsize() <= 1 and self.skip > 1:
+            self.skip -= 1
+        return True
+
+    def run(self, cap=None, show: bool = False) -> bool:
+        """Processa a fonte até acabar ou stop(). False se a fonte não abriu."""
+        cap = cap or cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return False
+        threads = [threading.Thread(target=self._decodificar, name=f"qr-decode-{i}", daemon=True)
+                   for i in range(self.workers)]
+        for th in threads:
+            th.start()
+        t0 = time.perf_counter()
+        ultimo = float("-inf")
+        idx = 0
+        try:
+            while not self._stop.is_set():
+                if not cap.grab():
+                    break
+                idx += 1
+                self.m["frames_read"] += 1
+                agora = time.monotonic()
+                if idx % self.skip or agora - ultimo < self.min_interval:
+                    continue
+                ok, frame = cap.retrieve()
+                if not ok:
+                    continue
+                if self._enfileirar((idx, time.time(), frame)):
+                    ultimo = agora
+                if show:
+                    cv2.imshow("Leitor de QR Code", frame)
+                    if cv2.waitKey(1) & 0xFF == ord("q"):
+                        break
+        finally:
             cap.release()
-            cv2.destroyAllWindows()
-            return
+            if show:
+                cv2.destroyAllWindows()
+            for _ in threads:
+                self.frames.put(None)
+            for th in threads:
+                th.join()
+            dt = time.perf_counter() - t0
+            self.m["elapsed_s"] = round(dt, 3)
+            self.m["read_fps"] = round(self.m["frames_read"] / dt, 1) if dt else 0.0
+            self.m["decode_fps"] = round(self.m["frames_decoded"] / dt, 1) if dt else 0.0
+        return True
 
-        cv2.imshow('Leitor de QR Code', frame)
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+def main():
+    ap = argparse.ArgumentParser(description="Leitor contínuo de QR Code (câmera, stream ou vídeo gravado)")
+    ap.add_argument("--source", default="0", help="índice da câmera, arquivo de vídeo ou URL (padrão: 0)")
+    ap.add_argument("--workers", type=int, default=2, help="threads de decode")
+    ap.add_argument("--scale", type=float, default=1.0, help="redução do quadro antes do decode (ex.: 0.5)")
+    ap.add_argument("--roi", default="", help='recorte "x,y,w,h" em fração do quadro')
+    ap.add_argument("--queue", type=int, default=4, help="quadros aguardando decode")
+    ap.add_argument("--dedupe", type=float, default=10.0, help="janela (s) para não repetir o mesmo QR")
+    ap.add_argument("--fps", type=float, default=0.0, help="máximo de quadros decodificados por segundo (0 = sem limite)")
+    ap.add_argument("--realtime", action="store_true", help="descarta quadros também em arquivo (simula a câmera)")
+    ap.add_argument("--show", action="store_true", help="mostra a janela do OpenCV ('q' encerra)")
+    args = ap.parse_args()
 
-    cap.release()
-    cv2.destroyAllWindows()
+    p = QrPipeline(args.source, workers=args.workers, scale=args.scale, roi=parse_roi(args.roi),
+                   queue_max=args.queue, dedupe_s=args.dedupe, max_fps=args.fps,
+                   realtime=True if args.realtime else None,
+                   on_code=lambda dados, ts, idx: print(f"[quadro {idx}] QR Code detectado: {dados}"))
+    try:
+        if not p.run(show=args.show):
+            print(f"❌ Não foi possível abrir a fonte {args.source!r}")
+            return 1
+    except KeyboardInterrupt:
+        p.stop()
+    m = p.m
+    print(f"📊 {m['frames_read']} quadros lidos ({m['read_fps']} fps), {m['frames_decoded']} decodificados "
+          f"({m['decode_fps']} fps), {m['frames_dropped']} descartados, {m['unique_codes']} QRs distintos "
+          f"em {m['elapsed_s']}s")
+    return 0
 
 
 if __name__ == "__main__":
-    leitor_qrcode()
+    sys.exit(main())
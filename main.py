@@ -1,27 +1,50 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, Query, UploadFile, File
+from fastapi.responses import HTMLResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 from typing import List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
 import json
+import time
 import os
-import csv
-import cx_Oracle
-import cv2
-from pyzbar.pyzbar import decode
+import queue
+import threading
+import zipfile
+from collections import deque, OrderedDict
 
 # --- .env / configuração segura ---
 from config import (
-    ORACLE_USER, ORACLE_PWD, ORACLE_DSN, validate_env,
-    MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD
+    validate_env, TELEMETRY_BATCH_MAX, FLEET_FOLLOW_INTERVAL_S, DASHBOARD_PUSH_INTERVAL_S,
+    SPOOL_REPLAY_ENABLED, TELEMETRY_FILE_BACKEND, DASHBOARD_PAGE_SIZE, AREAS_CACHE_TTL_S,
+    MOTOS_CACHE_TTL_S, MOTOS_BULK_MAX, QR_CAMERA_ENABLED, QR_SCAN_SCALE, QR_UPLOAD_MAX_BYTES,
+    QR_BATCH_MAX_FILES, QR_BATCH_MAX_BYTES, DETECTION_BATCH_MAX,
 )
 validate_env()
 
 # --- Persistência com fallback (Oracle → CSV) ---
 from persistence import (
     save_telemetria_db, save_telemetria_file, list_telemetria_db, list_telemetria_file,
-    save_command_db, save_command_file, save_detection_db, save_detection_file
+    save_telemetria_batch_db, save_telemetria_batch_file,
+    list_telemetria_moto_db, list_telemetria_moto_file, decode_cursor, IDX_TEL,
+    aggregate_telemetria_db, aggregate_telemetria_file,
+    save_command_db, save_command_file, save_detection_db, save_detection_file,
+    save_detection_batch_db, save_detection_batch_file,
+    save_moto_db, save_motos_batch_db, update_motos_batch_db,
+    F_TEL, F_CMD, F_DET, HDR_TEL, HDR_CMD, HDR_DET,
+    replay_telemetria_db, replay_command_db, replay_detection_db,
+    telemetry_store
 )
+from services.fleet_state import fleet
+from services import fleet_status, anomaly
+from services.telemetry_agg import BUCKETS
+from services.ttl_cache import TTLCache
+from services.qr_worker import QrCaptureWorker
+from services import qr_pool
+from services.detection_filter import detection_filter
+from services.spatial_index import spatial
+from leitor_qrcode import decodificar_imagem, parse_moto
 
 app = FastAPI(title="IOT + QR + Telemetria (Sprint 3)")
 
@@ -37,11 +60,29 @@ app.add_middleware(
 )
 
 # -------------------------------------------------------
-# Utilitário de conexão por requisição
+# Conexões Oracle via pool compartilhado
 # -------------------------------------------------------
+from services import oracle_pool
+from services.async_io import io_route, run_db
+from services import async_io
+
 def get_connection():
-    """Abre uma conexão nova com Oracle usando variáveis do .env."""
-    return cx_Oracle.connect(user=ORACLE_USER, password=ORACLE_PWD, dsn=ORACLE_DSN)
+    """Pega uma sessão do pool (conn.close() devolve a sessão ao pool)."""
+    return oracle_pool.acquire()
+
+@app.on_event("startup")
+def _startup_pool():
+    try:
+        oracle_pool.init_pool()
+    except Exception as e:
+        # sem Oracle a API segue com fallback em arquivo; o pool é recriado no próximo acquire
+        print("Pool Oracle indisponível no startup:", e)
+
+@app.get("/health/oracle")
+@io_route
+def health_oracle():
+    return {"ok": oracle_pool.ping(), "pool": oracle_pool.pool_metrics(),
+            "caches": [_motos_cache.metrics(), _areas_cache.metrics()]}
 
 # -------------------------------------------------------
 # Modelos existentes (tabelas T_IOT_*)
@@ -52,6 +93,12 @@ class Moto(BaseModel):
     modelo: str
     area: int
 
+class MotoIn(BaseModel):
+    """Moto nova (o ID vem do alocador)."""
+    placa: str
+    modelo: str
+    area: int
+
 class Area(BaseModel):
     id: int
     nome: str
@@ -82,91 +129,243 @@ class DetectionIn(BaseModel):
     id_moto: Optional[int] = None
     region: Optional[str] = None
 
+class DetectionBox(BaseModel):
+    label: str
+    conf: float
+    x: int
+    y: int
+    w: int
+    h: int
+    id_moto: Optional[int] = None
+    region: Optional[str] = None   # se ausente, vale a region do quadro
+
+class DetectionFrameIn(BaseModel):
+    """Todas as caixas de um quadro da câmera (YOLO/ArUco)."""
+    source: str
+    frame_id: Optional[int] = None
+    region: Optional[str] = None
+    boxes: List[DetectionBox]
+
+    def detections(self) -> List[DetectionIn]:
+        return [DetectionIn(source=self.source, frame_id=self.frame_id, label=b.label, conf=b.conf,
+                            x=b.x, y=b.y, w=b.w, h=b.h, id_moto=b.id_moto,
+                            region=b.region if b.region is not None else self.region)
+                for b in self.boxes]
+
 # -------------------------------------------------------
 # CRUD — MOTOS (T_IOT_MOTO)
 # -------------------------------------------------------
+# Tabelas de referência (motos, áreas) em cache read-through com TTL; toda escrita
+# pela API invalida o cache. A lista de motos fica já serializada em JSON.
+_motos_cache = TTLCache("motos", MOTOS_CACHE_TTL_S)
+_areas_cache = TTLCache("areas", AREAS_CACHE_TTL_S)
+
+def _carregar_motos_json() -> bytes:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.arraysize = 1000
+        cur.execute("SELECT ID_MOTO, DS_PLACA, NM_MODELO, ID_AREA FROM T_IOT_MOTO")
+        body = json.dumps([{"id": r[0], "placa": r[1], "modelo": r[2], "area": r[3]} for r in cur],
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        cur.close()
+    return body
+
 @app.get("/motos", response_model=List[Moto])
+@io_route
 def listar_motos():
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT ID_MOTO, DS_PLACA, NM_MODELO, ID_AREA FROM T_IOT_MOTO")
-        motos = [Moto(id=r[0], placa=r[1], modelo=r[2], area=r[3]) for r in cur.fetchall()]
-        cur.close(); conn.close()
-        return motos
+        return Response(_motos_cache.get("json", _carregar_motos_json), media_type="application/json")
     except Exception as e:
         print(f"❌ Erro no GET de motos: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/motos/qrcode", response_model=Moto)
-def cadastrar_moto_qrcode():
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        raise HTTPException(status_code=500, detail="❌ Não foi possível acessar a câmera")
-
-    dados_lidos = None
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            continue
-
-        for codigo in decode(frame):
-            dados_lidos = codigo.data.decode("utf-8")
-            cv2.imshow("QR Code Detectado - Fechando...", frame)
-            cv2.waitKey(1000)
-            cap.release()
-            cv2.destroyAllWindows()
-            break
-
-        cv2.imshow("Leitor de QR Code", frame)
-
-        if dados_lidos:
-            break
-
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            cap.release()
-            cv2.destroyAllWindows()
-            raise HTTPException(status_code=400, detail="❌ Leitura cancelada")
+@app.post("/motos/bulk", response_model=List[Moto], status_code=201)
+@io_route
+def cadastrar_motos_lote(motos: List[MotoIn]):
+    """Cadastro em lote: um executemany para todas as motos."""
+    if len(motos) > MOTOS_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"Lote acima de {MOTOS_BULK_MAX} motos")
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            ids = save_motos_batch_db(cur, motos)
+            conn.commit()
+            cur.close()
+    except Exception as e:
+        print(f"❌ Erro no POST em lote de motos: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    _motos_cache.invalidate()
+    return [Moto(id=i, placa=m.placa, modelo=m.modelo, area=m.area) for i, m in zip(ids, motos)]
 
+@app.put("/motos/bulk")
+@io_route
+def atualizar_motos_lote(motos: List[Moto]):
+    """Atualização em lote (executemany). IDs inexistentes voltam em not_found."""
+    if len(motos) > MOTOS_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"Lote acima de {MOTOS_BULK_MAX} motos")
     try:
-        dados = json.loads(dados_lidos)
-        placa = dados["placa"]
-        modelo = dados["modelo"]
-        area = dados["area"]
+        with get_connection() as conn:
+            cur = conn.cursor()
+            not_found = update_motos_batch_db(cur, motos)
+            conn.commit()
+            cur.close()
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"❌ QR Code inválido ou mal formatado: {e}")
+        print(f"❌ Erro no PUT em lote de motos: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    _motos_cache.invalidate()
+    return {"updated": len(motos) - len(not_found), "not_found": not_found}
 
+# Cadastro por QR Code: a API não abre câmera. Ou o cliente envia a foto do QR
+# (POST /motos/qrcode), ou o worker headless (services/qr_worker.py, QR_CAMERA_ENABLED=1)
+# publica os QRs lidos numa fila, consumida pela thread abaixo.
+def _registrar_moto_qr(dados: str) -> Moto:
+    """JSON do QR → moto cadastrada. ValueError se o QR não for de cadastro."""
+    try:
+        m = parse_moto(dados)
+    except Exception as e:
+        raise ValueError(f"QR Code inválido ou mal formatado: {e}")
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT NVL(MAX(ID_MOTO), 0) + 1 FROM T_IOT_MOTO")
-        id_moto = cur.fetchone()[0]
-
-        cur.execute(
-            """
-            INSERT INTO T_IOT_MOTO (ID_MOTO, DS_PLACA, NM_MODELO, ID_AREA)
-            VALUES (:id, :placa, :modelo, :area)
-            """,
-            {"id": id_moto, "placa": placa, "modelo": modelo, "area": area},
-        )
+        id_moto = save_moto_db(cur, m["placa"], m["modelo"], m["area"])
         conn.commit()
-        return Moto(id=id_moto, placa=placa, modelo=modelo, area=area)
-    except Exception as e:
+    except Exception:
         conn.rollback()
-        print(f"❌ Erro no POST de moto: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise
     finally:
         cur.close(); conn.close()
+    _motos_cache.invalidate()
+    return Moto(id=id_moto, **m)
+
+@app.post("/motos/qrcode", response_model=Moto)
+@io_route
+def cadastrar_moto_qrcode(file: UploadFile = File(...)):
+    dados = file.file.read(QR_UPLOAD_MAX_BYTES + 1)
+    if len(dados) > QR_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Imagem acima de {QR_UPLOAD_MAX_BYTES} bytes")
+    try:
+        codigos = decodificar_imagem(dados, QR_SCAN_SCALE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ {e}")
+    if not codigos:
+        raise HTTPException(status_code=422, detail="❌ Nenhum QR Code encontrado na imagem")
+    try:
+        return _registrar_moto_qr(codigos[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ {e}")
+    except Exception as e:
+        print(f"❌ Erro no POST de moto: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/motos/qrcode/batch")
+@io_route
+def cadastrar_motos_qrcode_lote(files: List[UploadFile] = File(...)):
+    """Várias fotos (ou .zip de fotos): decode paralelo num pool de processos e um único
+    INSERT em lote para todas as motos válidas. Devolve um resultado por imagem."""
+    if len(files) > QR_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Lote acima de {QR_BATCH_MAX_FILES} imagens")
+    arquivos, restante = [], QR_BATCH_MAX_BYTES
+    for f in files:
+        dados = f.file.read(restante + 1)   # nunca lê mais que o total permitido
+        restante -= len(dados)
+        if restante < 0:
+            raise HTTPException(status_code=413, detail=f"Lote acima de {QR_BATCH_MAX_BYTES} bytes")
+        arquivos.append((f.filename or f"arquivo_{len(arquivos)}", dados))
+    try:
+        arquivos = qr_pool.expandir(arquivos)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"❌ Zip inválido: {e}")
+    except qr_pool.LoteGrandeDemais as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    try:
+        decodificados = qr_pool.decode_many(arquivos)
+    except qr_pool.DecodeIndisponivel as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    resultados, validas, vistos = [], [], set()
+    for r in decodificados:
+        res = {"arquivo": r["arquivo"]}
+        resultados.append(res)
+        if "erro" in r:
+            res.update(status="erro", erro=r["erro"])
+            continue
+        if not r["codigos"]:
+            res.update(status="sem_qr")
+            continue
+        dados = r["codigos"][0]
+        try:
+            m = parse_moto(dados)
+        except Exception as e:
+            res.update(status="invalido", erro=f"QR Code inválido ou mal formatado: {e}")
+            continue
+        if dados in vistos:   # mesma moto fotografada duas vezes no lote
+            res.update(status="duplicado")
+            continue
+        vistos.add(dados)
+        res["status"] = "ok"
+        validas.append((res, MotoIn(**m)))
+
+    if validas:
+        try:
+            with get_connection() as conn:
+                cur = conn.cursor()
+                ids = save_motos_batch_db(cur, [m for _, m in validas])
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            print(f"❌ Erro no POST em lote de motos por QR: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        _motos_cache.invalidate()
+        for (res, m), id_moto in zip(validas, ids):
+            res["moto"] = Moto(id=id_moto, **m.model_dump()).model_dump()
+
+    return {"total": len(resultados), "cadastradas": len(validas), "resultados": resultados}
+
+qr_worker = QrCaptureWorker() if QR_CAMERA_ENABLED else None
+_qr_resultados = deque(maxlen=100)   # últimos cadastros vindos da câmera
+_qr_stop = threading.Event()
+
+def _consumir_qr():
+    while not _qr_stop.is_set():
+        try:
+            ev = qr_worker.events.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        res = {"dados": ev["dados"], "ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ev["ts"]))}
+        try:
+            res["moto"] = _registrar_moto_qr(ev["dados"]).model_dump()
+            print(f"✅ Moto cadastrada pela câmera: #{res['moto']['id']} {res['moto']['placa']}")
+        except Exception as e:
+            res["erro"] = str(e)
+            print(f"❌ QR da câmera não cadastrado: {e}")
+        _qr_resultados.append(res)
+
+@app.on_event("startup")
+def _startup_qr():
+    if qr_worker is not None:
+        qr_worker.start()
+        threading.Thread(target=_consumir_qr, name="qr-consumer", daemon=True).start()
+
+@app.on_event("shutdown")
+def _shutdown_qr():
+    _qr_stop.set()
+    qr_pool.shutdown()
+    if qr_worker is not None:
+        qr_worker.stop()
+
+@app.get("/motos/qrcode/events")
+def eventos_qrcode():
+    """Métricas do worker da câmera e os últimos QRs lidos por ele."""
+    return {"worker": qr_worker.metrics() if qr_worker is not None else None,
+            "recent": list(_qr_resultados)[::-1]}
 
 @app.put("/motos/{id}", response_model=Moto)
+@io_route
 def atualizar_moto(id: int, moto: Moto):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT 1 FROM T_IOT_MOTO WHERE ID_MOTO = :id", {"id": id})
-        if cur.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Moto não encontrada")
-
         cur.execute(
             """
             UPDATE T_IOT_MOTO
@@ -177,7 +376,10 @@ def atualizar_moto(id: int, moto: Moto):
             """,
             {"placa": moto.placa, "modelo": moto.modelo, "area": moto.area, "id": id},
         )
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Moto não encontrada")
         conn.commit()
+        _motos_cache.invalidate()
         return moto
     except HTTPException:
         raise
@@ -189,16 +391,16 @@ def atualizar_moto(id: int, moto: Moto):
         cur.close(); conn.close()
 
 @app.delete("/motos/{id}")
+@io_route
 def deletar_moto(id: int):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT 1 FROM T_IOT_MOTO WHERE ID_MOTO = :id", {"id": id})
-        if cur.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Moto não encontrada")
-
         cur.execute("DELETE FROM T_IOT_MOTO WHERE ID_MOTO = :id", {"id": id})
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Moto não encontrada")
         conn.commit()
+        _motos_cache.invalidate()
         return {"detail": "Moto deletada com sucesso"}
     except HTTPException:
         raise
@@ -212,57 +414,60 @@ def deletar_moto(id: int):
 # -------------------------------------------------------
 # CRUD — ÁREAS (T_IOT_AREA)
 # -------------------------------------------------------
+def _carregar_areas() -> List[dict]:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT ID_AREA, NM_AREA FROM T_IOT_AREA ORDER BY ID_AREA")
+        areas = [{"id": r[0], "nome": r[1]} for r in cur.fetchall()]
+        cur.close()
+    return areas
+
 @app.get("/areas", response_model=List[Area])
+@io_route
 def listar_areas():
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT ID_AREA, NM_AREA FROM T_IOT_AREA")
-        areas = [Area(id=r[0], nome=r[1]) for r in cur.fetchall()]
-        cur.close(); conn.close()
-        return areas
+        return Response(json.dumps(_areas_cache.get("todas", _carregar_areas), ensure_ascii=False),
+                        media_type="application/json")
     except Exception as e:
         print(f"❌ Erro no GET de áreas: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/areas", response_model=Area)
+@io_route
 def cadastrar_area(area: Area):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT 1 FROM T_IOT_AREA WHERE ID_AREA = :id", {"id": area.id})
-        if cur.fetchone():
-            raise HTTPException(status_code=400, detail="Área já existe com esse ID")
-
         cur.execute(
             "INSERT INTO T_IOT_AREA (ID_AREA, NM_AREA) VALUES (:id, :nome)",
             {"id": area.id, "nome": area.nome},
         )
         conn.commit()
+        _areas_cache.invalidate()
         return area
-    except HTTPException:
-        raise
     except Exception as e:
         conn.rollback()
+        if "ORA-00001" in str(e):   # violação da PK: a área já existe
+            raise HTTPException(status_code=400, detail="Área já existe com esse ID")
         print(f"❌ Erro no POST de área: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cur.close(); conn.close()
 
 @app.put("/areas/{id}", response_model=Area)
+@io_route
 def atualizar_area(id: int, area: Area):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT 1 FROM T_IOT_AREA WHERE ID_AREA = :id", {"id": id})
-        if cur.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Área não encontrada")
-
         cur.execute(
             "UPDATE T_IOT_AREA SET NM_AREA = :nome WHERE ID_AREA = :id",
             {"nome": area.nome, "id": id},
         )
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Área não encontrada")
         conn.commit()
+        _areas_cache.invalidate()
         return area
     except HTTPException:
         raise
@@ -274,16 +479,16 @@ def atualizar_area(id: int, area: Area):
         cur.close(); conn.close()
 
 @app.delete("/areas/{id}")
+@io_route
 def deletar_area(id: int):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT 1 FROM T_IOT_AREA WHERE ID_AREA = :id", {"id": id})
-        if cur.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Área não encontrada")
-
         cur.execute("DELETE FROM T_IOT_AREA WHERE ID_AREA = :id", {"id": id})
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Área não encontrada")
         conn.commit()
+        _areas_cache.invalidate()
         return {"detail": "Área deletada com sucesso"}
     except HTTPException:
         raise
@@ -297,65 +502,191 @@ def deletar_area(id: int):
 # -------------------------------------------------------
 # Sprint 3 — Telemetria (T_IOT_TELEMETRIA) com fallback
 # -------------------------------------------------------
+def _atualizar_frota(payloads):
+    for p in payloads:
+        fleet.update(p.id_moto, p.temp_c, p.vib, p.batt_pct)
+        anomaly.observe(p)
+
 @app.post("/telemetria", status_code=201)
+@io_route
 def publicar_telemetria(payload: TelemetryIn):
+    _atualizar_frota([payload])
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        new_id = save_telemetria_db(cur, payload)
-        conn.commit()
-        cur.close(); conn.close()
+        with get_connection() as conn:
+            cur = conn.cursor()
+            new_id = save_telemetria_db(cur, payload)
+            conn.commit()
+            cur.close()
         return {"id": new_id, "ok": True, "backend": "oracle"}
     except Exception as e:
         print("POST /telemetria: fallback para arquivo ->", e)
         new_id = save_telemetria_file(payload)
         return {"id": new_id, "ok": True, "backend": "file"}
 
+_telemetry_list = TypeAdapter(List[TelemetryIn])
+
+async def _ler_lote_json(request: Request) -> list:
+    """Aceita array JSON ou NDJSON (uma leitura por linha, lido em streaming)."""
+    ctype = request.headers.get("content-type", "")
+    if "ndjson" in ctype or "jsonl" in ctype:
+        itens, resto, n = [], b"", 0
+        async for chunk in request.stream():
+            linhas = (resto + chunk).split(b"\n")
+            resto = linhas.pop()
+            for linha in linhas:
+                n += 1
+                if linha.strip():
+                    try:
+                        itens.append(json.loads(linha))
+                    except ValueError as e:
+                        raise HTTPException(status_code=400, detail=f"NDJSON inválido na linha {n}: {e}")
+                if len(itens) > TELEMETRY_BATCH_MAX:
+                    raise HTTPException(status_code=413, detail=f"Lote acima de {TELEMETRY_BATCH_MAX} leituras")
+        if resto.strip():
+            try:
+                itens.append(json.loads(resto))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"NDJSON inválido na linha {n + 1}: {e}")
+        return itens
+    try:
+        itens = await request.json()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"JSON inválido: {e}")
+    if not isinstance(itens, list):
+        raise HTTPException(status_code=400, detail="O corpo deve ser um array de leituras")
+    return itens
+
+def _gravar_lote_telemetria(payloads: List[TelemetryIn]) -> dict:
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            n = save_telemetria_batch_db(cur, payloads)
+            conn.commit()
+            cur.close()
+        return {"count": n, "ok": True, "backend": "oracle"}
+    except Exception as e:
+        print("POST /telemetria/batch: fallback para arquivo ->", e)
+        n = save_telemetria_batch_file(payloads)
+        return {"count": n, "ok": True, "backend": "file"}
+
+@app.post("/telemetria/batch", status_code=201)
+async def publicar_telemetria_lote(request: Request):
+    itens = await _ler_lote_json(request)
+    if len(itens) > TELEMETRY_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Lote acima de {TELEMETRY_BATCH_MAX} leituras")
+    try:
+        payloads = _telemetry_list.validate_python(itens)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    if not payloads:
+        return {"count": 0, "ok": True, "backend": None}
+    _atualizar_frota(payloads)
+    return await run_db(_gravar_lote_telemetria, payloads)
+
 @app.get("/telemetria")
+@io_route
 def listar_telemetria(limit: int = 50):
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        rows = list_telemetria_db(cur, limit)
-        cur.close(); conn.close()
+        with get_connection() as conn:
+            cur = conn.cursor()
+            rows = list_telemetria_db(cur, limit)
+            cur.close()
         return {"backend": "oracle", "items": rows}
     except Exception as e:
         print("GET /telemetria: lendo de arquivo ->", e)
         return {"backend": "file", "items": list_telemetria_file(limit)}
 
+@app.get("/telemetria/aggregate")
+@io_route
+def agregar_telemetria(
+    bucket: str = "5m",
+    id_moto: Optional[int] = None,
+    ts_from: Optional[datetime] = Query(None, alias="from"),
+    ts_to: Optional[datetime] = Query(None, alias="to"),
+):
+    """min/max/avg/last de temp_c, vib e batt_pct por bucket (padrão: últimas 24h)."""
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket deve ser um de {list(BUCKETS)}")
+    minutes = BUCKETS[bucket]
+    ts_to = _hora_local(ts_to) or datetime.now()
+    ts_from = _hora_local(ts_from) or ts_to - timedelta(hours=24)
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            items = aggregate_telemetria_db(cur, minutes, id_moto, ts_from, ts_to)
+            cur.close()
+        backend = "oracle"
+    except Exception as e:
+        print("GET /telemetria/aggregate: lendo de arquivo ->", e)
+        items, backend = aggregate_telemetria_file(minutes, id_moto, ts_from, ts_to), "file"
+    return {"backend": backend, "bucket": bucket, "from": ts_from.isoformat(sep=" "),
+            "to": ts_to.isoformat(sep=" "), "items": items}
+
+def _hora_local(d: Optional[datetime]) -> Optional[datetime]:
+    """Datas com fuso viram hora local sem fuso (mesma base do TS gravado)."""
+    if d is not None and d.tzinfo is not None:
+        d = d.astimezone().replace(tzinfo=None)
+    return d
+
+@app.on_event("startup")
+def _startup_indice_telemetria():
+    # carrega/atualiza data/telemetria.csv.idx; a partir daqui cada append já indexa
+    if TELEMETRY_FILE_BACKEND != "binary":
+        IDX_TEL.sync()
+
+@app.get("/motos/{id}/telemetria")
+@io_route
+def historico_telemetria(
+    id: int,
+    ts_from: Optional[datetime] = Query(None, alias="from"),
+    ts_to: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Leituras da moto com from <= ts < to, mais recente primeiro.
+    Para a próxima página, repita a chamada com cursor=next_cursor."""
+    ts_from, ts_to = _hora_local(ts_from), _hora_local(ts_to)
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            items, nxt = list_telemetria_moto_db(cur, id, ts_from, ts_to, cursor, limit)
+            cur.close()
+        return {"backend": "oracle", "items": items, "next_cursor": nxt}
+    except Exception as e:
+        print(f"GET /motos/{id}/telemetria: lendo de arquivo ->", e)
+        items, nxt = list_telemetria_moto_file(id, ts_from, ts_to, cursor, limit)
+        return {"backend": "file", "items": items, "next_cursor": nxt}
+
 # -------------------------------------------------------
 # Sprint 3 — Comandos / Atuadores (T_IOT_ACIONAMENTO) com fallback + MQTT
 # -------------------------------------------------------
 @app.post("/commands", status_code=201)
+@io_route
 def acionar(payload: CommandIn):
     used_backend = "oracle"
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        new_id = save_command_db(cur, payload)
-        conn.commit()
-        cur.close(); conn.close()
+        with get_connection() as conn:
+            cur = conn.cursor()
+            new_id = save_command_db(cur, payload)
+            conn.commit()
+            cur.close()
     except Exception as e:
         print("POST /commands: fallback para arquivo ->", e)
         new_id = save_command_file(payload)
         used_backend = "file"
 
-    # Publicar comando via MQTT
-    try:
-        import paho.mqtt.client as mqtt
-        client = mqtt.Client()
-        if MQTT_USERNAME and MQTT_PASSWORD:
-            client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
-        client.connect(MQTT_BROKER, int(MQTT_PORT), 60)
-        topic = f"mottu/motos/{payload.id_moto}/commands"
-        client.publish(topic, json.dumps({
-            "id_moto": payload.id_moto,
-            "kind": payload.kind,
-            "reason": payload.reason
-        }))
-        client.disconnect()
-    except Exception as pub_err:
-        print("Aviso: falha ao publicar comando MQTT:", pub_err)
+    # Publicar comando via MQTT: só enfileira no publisher persistente
+    if not publisher.publish(f"mottu/motos/{payload.id_moto}/commands", {
+        "id_moto": payload.id_moto,
+        "kind": payload.kind,
+        "reason": payload.reason
+    }):
+        print("Aviso: fila do publisher MQTT cheia, comando não publicado")
 
     return {"id": new_id, "ok": True, "backend": used_backend}
 
@@ -363,19 +694,65 @@ def acionar(payload: CommandIn):
 # Sprint 3 — Detecções de Visão (T_IOT_DETECCAO) com fallback
 # -------------------------------------------------------
 @app.post("/deteccoes", status_code=201)
+@io_route
 def registrar_deteccao(payload: DetectionIn):
+    if not detection_filter.accepts(payload):
+        return {"id": None, "ok": True, "filtered": True}
+    spatial.update_many([payload])   # pode preencher id_moto (caixa associada a uma moto conhecida)
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        new_id = save_detection_db(cur, payload)
-        conn.commit()
-        cur.close(); conn.close()
+        with get_connection() as conn:
+            cur = conn.cursor()
+            new_id = save_detection_db(cur, payload)
+            conn.commit()
+            cur.close()
         return {"id": new_id, "ok": True, "backend": "oracle"}
     except Exception as e:
         print("POST /deteccoes: fallback para arquivo ->", e)
         new_id = save_detection_file(payload)
         return {"id": new_id, "ok": True, "backend": "file"}
 
+@app.post("/deteccoes/batch", status_code=201)
+@io_route
+def registrar_deteccoes_quadro(frame: DetectionFrameIn):
+    """Um quadro com N caixas → um único INSERT em lote (depois do filtro de ruído)."""
+    if len(frame.boxes) > DETECTION_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Quadro acima de {DETECTION_BATCH_MAX} caixas")
+    payloads, descartadas = detection_filter.split(frame.detections())
+    if not payloads:
+        return {"count": 0, "filtered": descartadas, "ok": True, "backend": None}
+    associadas = spatial.update_many(payloads)
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            n = save_detection_batch_db(cur, payloads)
+            conn.commit()
+            cur.close()
+        backend = "oracle"
+    except Exception as e:
+        print("POST /deteccoes/batch: fallback para arquivo ->", e)
+        n, backend = save_detection_batch_file(payloads), "file"
+    return {"count": n, "filtered": descartadas, "associated": associadas, "ok": True, "backend": backend}
+
+@app.get("/motos/{id}/location")
+def localizacao_moto(id: int):
+    """Última posição vista da moto (índice em memória, sem consultar T_IOT_DETECCAO)
+    junto com a última telemetria."""
+    loc = spatial.location(id)
+    if loc is None:
+        raise HTTPException(status_code=404, detail="Nenhuma detecção recente dessa moto")
+    loc["telemetria"] = fleet.get(id)
+    return loc
+
+@app.get("/deteccoes/index")
+def indice_deteccoes():
+    """Tamanho e contadores do índice espacial (associações feitas, caixas sem par)."""
+    return spatial.metrics()
+
+@app.get("/deteccoes/filter")
+def filtro_deteccoes():
+    """Regras do filtro de ruído e quantas detecções ele aceitou/descartou."""
+    return detection_filter.metrics()
+
 # -------------------------------------------------------
 # Inicia o subscriber MQTT em background
 # -------------------------------------------------------
@@ -388,62 +765,94 @@ try:
 except Exception as e:
     print("MQTT indisponível:", e)
 
+from services.mqtt_publisher import publisher
+
+@app.on_event("startup")
+def _startup_publisher():
+    try:
+        publisher.start()
+    except Exception as e:
+        print("MQTT publisher indisponível:", e)
+
+@app.on_event("shutdown")
+def _shutdown_mqtt():
+    publisher.stop()
+    if getattr(app.state, "_mqtt_started", False):
+        from services.mqtt_subscriber import stop_background
+        stop_background()
+
+# -------------------------------------------------------
+# Alertas de anomalia (services/anomaly.py) → MQTT + comando automático
+# -------------------------------------------------------
+def _tratar_alerta(alerta: dict):
+    """Roda no caminho de ingestão: só enfileira (publisher e buffer de comandos)."""
+    id_moto = alerta["id_moto"]
+    print(f"🚨 Moto #{id_moto}: {alerta['kind']} – {alerta['detail']}")
+    publisher.publish(f"mottu/motos/{id_moto}/alerts", alerta)
+    kind = anomaly.actions.get(alerta["kind"])
+    if kind:
+        cmd = CommandIn(id_moto=id_moto, kind=kind, reason=f"auto: {alerta['detail']}")
+        from services import mqtt_subscriber
+        mqtt_subscriber.cmd_buffer.offer(cmd)   # gravação write-behind, como os comandos via MQTT
+        if not publisher.publish(f"mottu/motos/{id_moto}/commands", cmd.model_dump()):
+            print("Aviso: fila do publisher MQTT cheia, comando automático não publicado")
+
+anomaly.detector.add_handler(_tratar_alerta)
+
+@app.get("/alerts")
+def listar_alertas(limit: int = Query(50, ge=1, le=500)):
+    """Alertas mais recentes (em memória) e contadores do detector."""
+    recentes = list(anomaly.detector.recent)[-limit:][::-1]
+    return {"items": recentes, "metrics": anomaly.detector.metrics(), "actions": anomaly.actions}
+
+@app.get("/health/mqtt")
+def health_mqtt():
+    """Buffers write-behind do subscriber + fila/latência do publisher."""
+    from services import mqtt_subscriber
+    return {
+        "started": getattr(app.state, "_mqtt_started", False),
+        "buffers": mqtt_subscriber.metrics(),
+        "publisher": publisher.metrics(),
+    }
+
 # =======================================================
 # NOVO DASHBOARD – 4 ZONAS CARDEAIS (USANDO telemetria.csv do simulador)
 # =======================================================
 
-# Carrega CSV do simulador (mesma lógica do main novo)
+# Estado da frota em memória, seguindo o CSV do simulador de forma incremental
+@app.on_event("startup")
+def _startup_fleet():
+    if TELEMETRY_FILE_BACKEND == "binary":
+        # última leitura por moto direto do memmap, sem parse de texto
+        from services.telemetry_store import to_dicts
+        for r in to_dicts(telemetry_store().latest_per_moto()):
+            fleet.update(r["id_moto"], r["temp_c"], r["vib"], r["batt_pct"], timestamp=r["ts"])
+    fleet.refresh()
+    fleet.follow(FLEET_FOLLOW_INTERVAL_S)
+
+@app.on_event("shutdown")
+def _shutdown_fleet():
+    fleet.stop()
+
 def carregar_motos():
-    possible_paths = [
-        os.path.join("data", "telemetria.csv"),
-        os.path.join(os.getcwd(), "data", "telemetria.csv"),
-        os.path.join(os.getcwd(), "Sprint1_IOT-main", "data", "telemetria.csv"),
-    ]
-    csv_path = next((p for p in possible_paths if os.path.exists(p)), None)
-
-    if not csv_path:
-        print("❌ Nenhum arquivo de telemetria encontrado.")
-        return []
-
-    motos = {}
-    try:
-        with open(csv_path, encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    idm = int(row.get("id_moto", 0))
-                    motos[idm] = {
-                        "id_moto": idm,
-                        "temp_c": float(row.get("temp_c", 0)),
-                        "vib": float(row.get("vib", 0)),
-                        "batt_pct": float(row.get("batt_pct", 0)),
-                        "zona": row.get("zona", "Desconhecida"),
-                        "timestamp": row.get("timestamp", ""),
-                    }
-                except Exception as e:
-                    print("⚠️ Linha inválida no CSV:", e)
-        print(f"✅ {len(motos)} motos carregadas de {csv_path}")
-        return list(motos.values())
-    except Exception as e:
-        print("❌ Erro ao ler CSV:", e)
-        return []
+    """Snapshot da última leitura por moto (sem tocar no disco)."""
+    return fleet.snapshot()
 
 def statusPill(v):
-    batt = float(v.get("batt_pct", 100))
-    temp = float(v.get("temp_c", 25))
-    vib = float(v.get("vib", 0))
-    if batt < 25 or temp > 60:
-        return '<span class="pill maint">manutenção</span>'
-    if vib > 1.0:
-        return '<span class="pill use">em uso</span>'
-    return '<span class="pill stop">parada</span>'
-
-def cards_zona(zona, motos):
+    s = v.get("status") or fleet_status.annotate([v])[0]["status"]
+    return f'<span class="pill {fleet_status.CSS[s]}">{fleet_status.LABELS[s]}</span>'
+
+@app.get("/fleet/status")
+def status_frota():
+    """Contagem de motos por status e por zona (mesma regra do dashboard)."""
+    return fleet_status.summary(carregar_motos())
+
+def cards_zona(motos):
+    """HTML dos cards (as motos já vêm filtradas pela zona)."""
     cards = []
     for v in motos:
-        if v.get("zona", "").lower() == zona.lower():
-            cards.append(f"""
-            <div class="moto-card" onclick="mostrarDetalhes({v['id_moto']})">
+        cards.append(f"""
+            <div class="moto-card" id="moto-{v['id_moto']}" onclick="mostrarDetalhes({v['id_moto']})">
                 <div class="moto-head">
                     <div style="font:600 16px/1.2 system-ui">Moto #{v['id_moto']}</div>
                     {statusPill(v)}
@@ -459,151 +868,192 @@ def cards_zona(zona, motos):
             """)
     return "\n".join(cards)
 
+# HTML do dashboard: página estática em templates/, lida uma vez e servida com ETag.
+# Os dados vêm à parte: /dashboard/data (JSON) e /dashboard/zonas/<zona> (cards da zona).
+_DASHBOARD_HTML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "dashboard.html")
+_BOOT = format(int(time.time()), "x")   # entra nas ETags: versões não colidem entre reinícios
+_shell = None
+# (zona, página, tamanho) → (versão da zona, html dos cards); LRU limitado, porque
+# página/tamanho/zona vêm do cliente
+_fragmentos: "OrderedDict[tuple, tuple]" = OrderedDict()
+_FRAGMENTOS_MAX = 256
+_fragmentos_lock = threading.Lock()
+
+def _shell_dashboard():
+    global _shell
+    if _shell is None:
+        with open(_DASHBOARD_HTML, "rb") as f:
+            body = f.read()
+        _shell = (body, '"%s"' % hashlib.sha1(body).hexdigest()[:16])
+    return _shell
+
+def _condicional(request: Request, etag: str, render, media_type: str, headers: dict = None) -> Response:
+    """304 sem corpo se o cliente já tem essa versão (If-None-Match); senão chama render()."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    enviadas = [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+    if etag in enviadas or "*" in enviadas:
+        return Response(status_code=304, headers=headers)
+    return Response(render(), media_type=media_type, headers=headers)
+
 @app.get("/dashboard", response_class=HTMLResponse)
-def dashboard():
-    motos = carregar_motos()
-
-    if not motos:
-        return """
-        <h1 style='text-align:center;margin-top:40px;color:#444'>
-        ⚠️ Nenhum dado encontrado no arquivo CSV.<br>
-        Verifique se o simulador está rodando e gerando <b>data/telemetria.csv</b>.
-        </h1>
-        """
-
-    total = len(motos)
-
-    return f"""
-<!doctype html>
-<html lang="pt-br">
-<head>
-<meta charset="utf-8"/>
-<title>🏍️ Mapa IoT - 4 Zonas Cardeais</title>
-<meta name="viewport" content="width=device-width, initial-scale=1"/>
-<style>
-  :root {{
-    --card-bg:#fff;--text:#111827;--muted:#374151;--accent:#2563eb;--border:#e5e7eb;
-  }}
-  body {{
-    font-family:Arial,Helvetica,sans-serif;margin:0;background:#f9fafb;color:var(--text);
-  }}
-  h1 {{
-    background:var(--accent);color:white;padding:16px;text-align:center;margin:0;
-  }}
-  #info-bar {{
-    text-align:center;
-    background:#eef3ff;
-    padding:8px;
-    color:#333;
-    font-weight:500;
-  }}
-  #mapa {{
-    display:grid;
-    grid-template-columns:1fr 1fr;
-    grid-template-rows:1fr 1fr;
-    height:85vh;
-    border-top:2px solid var(--border);
-    border-left:2px solid var(--border);
-  }}
-  .zona {{
-    border-right:2px solid var(--border);
-    border-bottom:2px solid var(--border);
-    padding:12px;
-    position:relative;
-    overflow:auto;
-  }}
-  .zona h2 {{
-    position:absolute;top:8px;left:12px;font-size:16px;color:#2563eb;margin:0;
-  }}
-  .zona-grid {{
-    display:grid;
-    grid-template-columns:repeat(auto-fill,minmax(220px,1fr));
-    gap:12px;
-    margin-top:30px;
-  }}
-  .moto-card {{
-    border:1px solid var(--border);
-    border-radius:12px;
-    padding:12px;
-    background:var(--card-bg);
-    box-shadow:0 1px 2px rgba(0,0,0,.05);
-    cursor:pointer;
-    transition:transform .15s;
-  }}
-  .moto-card:hover {{transform:scale(1.03);}}
-  .moto-head {{display:flex;justify-content:space-between;align-items:center;margin-bottom:8px;}}
-  .pill {{
-    padding:2px 8px;border-radius:999px;font:500 12px/1 system-ui;border:1px solid transparent;
-  }}
-  .pill.use{{background:#e6f4ff;color:#084d86;border-color:#bfe1ff}}
-  .pill.stop{{background:#edf7ed;color:#0b5e0b;border-color:#cfe9cf}}
-  .pill.maint{{background:#fff2f0;color:#8a1f11;border-color:#ffd8d3}}
-  .muted{{font:400 13px/1.5 system-ui;color:var(--muted)}}
-  #painel {{
-    position:fixed;top:0;left:0;width:100%;height:100%;background:rgba(0,0,0,0.5);
-    display:none;align-items:center;justify-content:center;
-  }}
-  #painel .conteudo {{
-    background:white;padding:20px;border-radius:12px;width:90%;max-width:500px;
-    box-shadow:0 6px 16px rgba(0,0,0,0.3);
-  }}
-  #painel button {{
-    background:var(--accent);border:none;color:white;padding:8px 16px;border-radius:8px;cursor:pointer;
-  }}
-</style>
-</head>
-<body>
-<h1>📍 Pátio das Motos – 4 Zonas Cardeais</h1>
-<div id="info-bar">🚀 {total} motos carregadas do simulador – atualização automática a cada 10s</div>
-
-<div id="mapa">
-  <div class="zona"><h2>Noroeste</h2><div class="zona-grid">{cards_zona("Noroeste", motos)}</div></div>
-  <div class="zona"><h2>Nordeste</h2><div class="zona-grid">{cards_zona("Nordeste", motos)}</div></div>
-  <div class="zona"><h2>Sudoeste</h2><div class="zona-grid">{cards_zona("Sudoeste", motos)}</div></div>
-  <div class="zona"><h2>Sudeste</h2><div class="zona-grid">{cards_zona("Sudeste", motos)}</div></div>
-</div>
-
-<div id="painel">
-  <div class="conteudo">
-    <h2 id="tituloMoto">Detalhes da Moto</h2>
-    <p id="textoExplicacao"></p>
-    <button onclick="fecharPainel()">Fechar</button>
-  </div>
-</div>
-
-<script>
-const motos = {json.dumps(motos, ensure_ascii=False)};
-function mostrarDetalhes(id) {{
-  const m = motos.find(x => x.id_moto === id);
-  if (!m) return;
-  const painel = document.getElementById("painel");
-  const titulo = document.getElementById("tituloMoto");
-  const texto = document.getElementById("textoExplicacao");
-  titulo.innerText = "Moto #" + m.id_moto + " – Zona " + m.zona;
-  let explicacao = "";
-  if (m.batt_pct < 25) {{
-    explicacao += "⚠️ <b>Bateria crítica</b>: abaixo de 25%. Recolher para recarga.<br><br>";
-  }}
-  if (m.temp_c > 65) {{
-    explicacao += "🔥 <b>Alta temperatura</b>: possível superaquecimento.<br><br>";
-  }}
-  if (m.vib > 1.0) {{
-    explicacao += "🏍️ <b>Moto em uso</b>: vibração alta detectada.<br><br>";
-  }}
-  if (!explicacao) {{
-    explicacao = "✅ Moto em boas condições.";
-  }}
-  texto.innerHTML = explicacao;
-  painel.style.display = "flex";
-}}
-function fecharPainel() {{
-  document.getElementById("painel").style.display = "none";
-}}
-setTimeout(() => location.reload(), 10000);
-</script>
-</body>
-</html>
-"""
+def dashboard(request: Request):
+    body, etag = _shell_dashboard()
+    return _condicional(request, etag, lambda: body, "text/html; charset=utf-8")
+
+# zonas = áreas cadastradas (T_IOT_AREA, em cache) + zonas que aparecem na telemetria
+def _zonas_dashboard() -> List[dict]:
+    try:
+        areas = _areas_cache.get("todas", _carregar_areas)
+    except Exception as e:
+        print("Dashboard: áreas indisponíveis, usando só as zonas da telemetria ->", e)
+        areas = []
+    frota = fleet.zones()
+    zonas, vistas = [], set()
+    for a in areas:
+        chave = a["nome"].lower()
+        if chave in vistas:
+            continue
+        vistas.add(chave)
+        zonas.append({"chave": chave, "nome": a["nome"], "total": frota.pop(chave, {"total": 0})["total"]})
+    for chave, z in sorted(frota.items(), key=lambda kv: kv[1]["nome"]):
+        zonas.append({"chave": chave, "nome": z["nome"], "total": z["total"]})
+    return zonas
+
+@app.get("/dashboard/data")
+@io_route
+def dashboard_data(request: Request):
+    """Zonas (com total de motos), regras de status e tamanho de página, em JSON compacto.
+    As motos vêm por zona em /dashboard/zonas/<zona> e as mudanças pelo SSE."""
+    body = json.dumps({
+        "version": fleet.version,
+        "total": len(fleet),
+        "page_size": DASHBOARD_PAGE_SIZE,
+        "regras": fleet_status.thresholds(),
+        "status_css": fleet_status.CSS,
+        "status_label": fleet_status.LABELS,
+        "zonas": _zonas_dashboard(),
+    }, ensure_ascii=False, separators=(",", ":"))
+    etag = 'W/"%s"' % hashlib.sha1(body.encode()).hexdigest()[:16]
+    return _condicional(request, etag, lambda: body, "application/json")
+
+@app.get("/dashboard/zonas/{zona}", response_class=HTMLResponse)
+def dashboard_zona(zona: str, request: Request, page: int = Query(0, ge=0),
+                   size: int = Query(DASHBOARD_PAGE_SIZE, ge=1, le=500)):
+    """Uma página de cards da zona (por id_moto). O HTML fica em cache até a zona mudar
+    (versão do FleetState); X-Total informa quantas motos a zona tem."""
+    zona = zona.lower()
+    ver = fleet.zone_version(zona)
+    total = fleet.zones().get(zona, {}).get("total", 0)
+
+    def render():
+        chave = (zona, page, size)
+        with _fragmentos_lock:
+            cache = _fragmentos.get(chave)
+            if cache is not None and cache[0] == ver:
+                _fragmentos.move_to_end(chave)
+                return cache[1]
+        motos = fleet_status.annotate(fleet.snapshot_zona(zona, page * size, size))
+        html = cards_zona(motos)
+        if ver:   # só zonas que existem entram no cache
+            with _fragmentos_lock:
+                _fragmentos[chave] = (ver, html)
+                _fragmentos.move_to_end(chave)
+                while len(_fragmentos) > _FRAGMENTOS_MAX:
+                    _fragmentos.popitem(last=False)
+        return html
+    # o nome da zona vem da URL: na ETag vai só um hash (header é latin-1, sem aspas)
+    tag_zona = hashlib.sha1(zona.encode("utf-8")).hexdigest()[:12]
+    return _condicional(request, f'W/"{_BOOT}-{tag_zona}-{ver}-{page}-{size}"', render,
+                        "text/html; charset=utf-8", {"X-Total": str(total)})
+
+# -------------------------------------------------------
+# Push ao vivo do dashboard (Server-Sent Events)
+# Um único laço coleta as motos alteradas e distribui para todos os clientes.
+# -------------------------------------------------------
+from services.broadcaster import Broadcaster
+
+def _snapshot_json() -> str:
+    return json.dumps(fleet_status.annotate(fleet.snapshot()), ensure_ascii=False)
+
+broadcaster = Broadcaster(resync=_snapshot_json)
+
+async def _fanout_loop():
+    while True:
+        await asyncio.sleep(DASHBOARD_PUSH_INTERVAL_S)
+        try:
+            mudancas = fleet.take_changes()
+            if mudancas and len(broadcaster):
+                broadcaster.publish(json.dumps(fleet_status.annotate(mudancas), ensure_ascii=False))
+        except Exception as e:
+            # um erro num ciclo não pode matar o fan-out do SSE; segue no próximo
+            print("⚠️ Falha no fan-out do dashboard:", e)
+
+@app.on_event("startup")
+async def _startup_fanout():
+    app.state._fanout_task = asyncio.create_task(_fanout_loop())
+
+@app.on_event("shutdown")
+async def _shutdown_fanout():
+    task = getattr(app.state, "_fanout_task", None)
+    if task is not None:
+        task.cancel()
+
+@app.get("/dashboard/stream")
+async def dashboard_stream(request: Request):
+    q = broadcaster.subscribe()
+    # estado atual primeiro: cobre mudanças entre o carregamento da página e a conexão
+    q.put_nowait(_snapshot_json())
+
+    async def eventos():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    msg = await asyncio.wait_for(q.get(), timeout=15)
+                    yield f"data: {msg}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # mantém a conexão viva em proxies
+        finally:
+            broadcaster.unsubscribe(q)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# -------------------------------------------------------
+# Replay do spool: CSVs de fallback voltam para o Oracle quando ele se recupera
+# -------------------------------------------------------
+from services.spool_replayer import Spool, SpoolReplayer
+
+if TELEMETRY_FILE_BACKEND == "binary":
+    from services.telemetry_store import BinarySpool
+    _spool_tel = BinarySpool("telemetria", telemetry_store(), replay_telemetria_db)
+else:
+    _spool_tel = Spool("telemetria", F_TEL, HDR_TEL, replay_telemetria_db)
+
+replayer = SpoolReplayer([
+    _spool_tel,
+    Spool("comandos", F_CMD, HDR_CMD, replay_command_db),
+    Spool("deteccoes", F_DET, HDR_DET, replay_detection_db),
+])
+
+@app.on_event("startup")
+def _startup_replayer():
+    if SPOOL_REPLAY_ENABLED:
+        replayer.start()
+
+@app.on_event("shutdown")
+def _shutdown_replayer():
+    replayer.stop()
+
+@app.get("/health/spool")
+def health_spool():
+    """Profundidade do spool (bytes ainda não reenviados) e taxa de drenagem por arquivo."""
+    return {"enabled": SPOOL_REPLAY_ENABLED, "spools": replayer.metrics()}
+
+# fecha executores e pool por último (buffers do subscriber ainda gravam no Oracle no shutdown)
+@app.on_event("shutdown")
+def _shutdown_pool():
+    async_io.shutdown()
+    oracle_pool.close_pool()
 
 @app.get("/")
 def root():
@@ -1,5 +1,14 @@
-﻿import os, csv, time
-from typing import Dict, List
+﻿import os, csv, time, base64
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config import ORACLE_ID_STRATEGY, ORACLE_ID_BLOCK, TELEMETRY_FILE_BACKEND, TELEMETRY_ROLLUP
+from services.id_allocator import (
+    make_allocator, insert_with_id, insert_many_with_ids, insert_many_returning_ids,
+    merge_many_with_ids, FileCounter
+)
+from services.csv_tail import read_header, last_lines
+from services.telemetry_index import MotoOffsetIndex
 
 # --- diretório local para persistência em arquivo ---
 DATA_DIR = os.path.join(os.getcwd(), "data")
@@ -15,6 +24,40 @@ HDR_TEL = ["id","id_moto","temp_c","vib","batt_pct","ts"]
 HDR_CMD = ["id","id_moto","kind","reason","ts"]
 HDR_DET = ["id","source","label","conf","x","y","w","h","frame_id","id_moto","region","ts"]
 
+# alocadores de ID (Oracle: sequence/identity; arquivo: contador local persistente)
+ID_TEL  = make_allocator(ORACLE_ID_STRATEGY, "SQ_IOT_TELEMETRIA",  "T_IOT_TELEMETRIA",  "ID", ORACLE_ID_BLOCK)
+ID_CMD  = make_allocator(ORACLE_ID_STRATEGY, "SQ_IOT_ACIONAMENTO", "T_IOT_ACIONAMENTO", "ID", ORACLE_ID_BLOCK)
+ID_DET  = make_allocator(ORACLE_ID_STRATEGY, "SQ_IOT_DETECCAO",    "T_IOT_DETECCAO",    "ID", ORACLE_ID_BLOCK)
+ID_MOTO = make_allocator(ORACLE_ID_STRATEGY, "SQ_IOT_MOTO",        "T_IOT_MOTO",        "ID_MOTO", ORACLE_ID_BLOCK)
+
+# backend binário de telemetria (TELEMETRY_FILE_BACKEND=binary): segmentos diários em data/telemetria_bin
+BIN_TEL_DIR = os.path.join(DATA_DIR, "telemetria_bin")
+_bin_store = None
+_bin_counter = None
+
+def telemetry_store():
+    """TelemetryStore binário (import tardio: numpy só é exigido neste backend)."""
+    global _bin_store
+    if _bin_store is None:
+        from services.telemetry_store import TelemetryStore
+        _bin_store = TelemetryStore(BIN_TEL_DIR)
+    return _bin_store
+
+def telemetry_counter() -> FileCounter:
+    global _bin_counter
+    if _bin_counter is None:
+        _bin_counter = FileCounter(os.path.join(BIN_TEL_DIR, "telemetria"),
+                                   last_id=lambda: telemetry_store().last_id())
+    return _bin_counter
+
+def _binary_backend() -> bool:
+    return TELEMETRY_FILE_BACKEND == "binary"
+
+CNT_TEL = FileCounter(F_TEL)
+IDX_TEL = MotoOffsetIndex(F_TEL)   # índice por moto do CSV (data/telemetria.csv.idx)
+CNT_CMD = FileCounter(F_CMD)
+CNT_DET = FileCounter(F_DET)
+
 def _now_str():
     return time.strftime("%Y-%m-%d %H:%M:%S")
 
@@ -26,35 +69,42 @@ def _append_csv(path: str, header: List[str], row: Dict):
             w.writeheader()
         w.writerow(row)
 
+def _append_csv_many(path: str, header: List[str], rows: List[Dict]):
+    """Um único open/append bufferizado para o lote inteiro."""
+    exists = os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8", buffering=1 << 16) as f:
+        w = csv.DictWriter(f, fieldnames=header)
+        if not exists:
+            w.writeheader()
+        w.writerows(rows)
+
 def _read_tail_csv(path: str, limit: int, header: List[str]) -> List[Dict]:
+    """Últimas `limit` linhas (mais recente primeiro). O CSV é append-only, então a
+    ordem do arquivo já é a ordem de ts: lê só o fim, sem carregar o arquivo todo."""
     if not os.path.exists(path):
         return []
-    rows: List[Dict] = []
-    with open(path, "r", newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            rows.append(row)
-    # ordena pelo ts desc se existir
-    rows.sort(key=lambda d: d.get("ts",""), reverse=True)
-    return rows[:limit]
+    file_header = next(csv.reader([read_header(path)]), None) or header
+    linhas = last_lines(path, limit)
+    return [dict(zip(file_header, row)) for row in csv.reader(linhas)]
 
 # ------- TELEMETRIA -------
 def save_telemetria_db(cur, payload) -> int:
     """Tenta salvar no Oracle, retorna id gerado. Levanta exceção se falhar."""
-    cur.execute("SELECT NVL(MAX(ID),0)+1 FROM T_IOT_TELEMETRIA")
-    new_id = cur.fetchone()[0]
-    cur.execute("""
-        INSERT INTO T_IOT_TELEMETRIA (ID, ID_MOTO, TEMP_C, VIB, BATT_PCT)
-        VALUES (:id, :id_moto, :temp, :vib, :batt)
-    """, dict(id=new_id, id_moto=payload.id_moto, temp=payload.temp_c, vib=payload.vib, batt=payload.batt_pct))
+    new_id = insert_with_id(cur, ID_TEL, "T_IOT_TELEMETRIA", "ID", dict(
+        id_moto=payload.id_moto, temp_c=payload.temp_c, vib=payload.vib, batt_pct=payload.batt_pct,
+    ))
+    if TELEMETRY_ROLLUP:
+        rollup_telemetria_db(cur, [payload])
     return new_id
 
 def save_telemetria_file(payload) -> int:
-    """Persistência em arquivo (CSV). Gera id incremental local simples."""
-    next_id = 1
-    if os.path.exists(F_TEL):
-        with open(F_TEL, "r", encoding="utf-8") as f:
-            next_id = sum(1 for _ in f)  # inclui header
+    """Persistência em arquivo (CSV ou binário). Id vem do contador local persistente."""
+    if _binary_backend():
+        from services.telemetry_store import build
+        next_id = telemetry_counter().next_id()
+        telemetry_store().append(build([next_id], [payload], int(time.time())))
+        return next_id
+    next_id = CNT_TEL.next_id()
     row = {
         "id": next_id,
         "id_moto": payload.id_moto,
@@ -64,8 +114,40 @@ def save_telemetria_file(payload) -> int:
         "ts": _now_str(),
     }
     _append_csv(F_TEL, HDR_TEL, row)
+    if IDX_TEL.loaded:
+        IDX_TEL.sync()
     return next_id
 
+def save_telemetria_batch_db(cur, payloads) -> int:
+    """Lote inteiro com um executemany. Retorna quantas linhas foram gravadas."""
+    n = insert_many_with_ids(cur, ID_TEL, "T_IOT_TELEMETRIA", "ID", [
+        dict(id_moto=p.id_moto, temp_c=p.temp_c, vib=p.vib, batt_pct=p.batt_pct)
+        for p in payloads
+    ])
+    if TELEMETRY_ROLLUP:
+        rollup_telemetria_db(cur, payloads)
+    return n
+
+def save_telemetria_batch_file(payloads) -> int:
+    """Lote inteiro num único append (CSV ou segmento binário)."""
+    payloads = list(payloads)
+    if not payloads:
+        return 0
+    if _binary_backend():
+        from services.telemetry_store import build
+        ids = telemetry_counter().next_ids(len(payloads))
+        telemetry_store().append(build(ids, payloads, int(time.time())))
+        return len(payloads)
+    ids = CNT_TEL.next_ids(len(payloads))
+    ts = _now_str()
+    _append_csv_many(F_TEL, HDR_TEL, [
+        {"id": i, "id_moto": p.id_moto, "temp_c": p.temp_c, "vib": p.vib, "batt_pct": p.batt_pct, "ts": ts}
+        for i, p in zip(ids, payloads)
+    ])
+    if IDX_TEL.loaded:
+        IDX_TEL.sync()
+    return len(payloads)
+
 def list_telemetria_db(cur, limit: int):
     cur.execute("""
         SELECT ID, ID_MOTO, TEMP_C, VIB, BATT_PCT, TO_CHAR(TS,'YYYY-MM-DD HH24:MI:SS')
@@ -79,23 +161,232 @@ def list_telemetria_db(cur, limit: int):
     ]
 
 def list_telemetria_file(limit: int):
+    if _binary_backend():
+        from services.telemetry_store import to_dicts
+        return to_dicts(telemetry_store().tail(limit))
     return _read_tail_csv(F_TEL, limit, HDR_TEL)
 
+# ------- HISTÓRICO POR MOTO (paginação por cursor) -------
+# cursor = (ts, id) da última linha devolvida; a próxima página pega o que vem
+# antes desse par na ordem (ts DESC, id DESC). Vale para qualquer backend.
+def encode_cursor(ts: str, id_: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts}|{id_}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Levanta ValueError se o cursor não for válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, id_ = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(id_)
+    except Exception as e:
+        raise ValueError(f"cursor inválido: {cursor}") from e
+
+def _page(items: List[Dict], limit: int, ts_key: str = "ts") -> Tuple[List[Dict], Optional[str]]:
+    """Recebe até limit+1 itens; devolve a página e o cursor da próxima (ou None)."""
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(items[-1][ts_key], items[-1]["id"])
+
+def list_telemetria_moto_db(cur, id_moto: int, ts_from: Optional[datetime], ts_to: Optional[datetime],
+                            cursor: Optional[str], limit: int):
+    """Usa o índice IX_IOT_TELEMETRIA_MOTO_TS (sql/telemetria_indexes.sql)."""
+    where, binds = ["ID_MOTO = :m"], {"m": id_moto, "lim": limit + 1}
+    if ts_from is not None:
+        where.append("TS >= :f"); binds["f"] = ts_from
+    if ts_to is not None:
+        where.append("TS < :t"); binds["t"] = ts_to
+    if cursor:
+        cts, cid = decode_cursor(cursor)
+        # ts do cursor como texto: bind de datetime viraria DATE e perderia as frações
+        where.append("(TS < TO_TIMESTAMP(:cts,'YYYY-MM-DD HH24:MI:SS.FF6') "
+                     "OR (TS = TO_TIMESTAMP(:cts,'YYYY-MM-DD HH24:MI:SS.FF6') AND ID < :cid))")
+        binds["cts"], binds["cid"] = cts.strftime("%Y-%m-%d %H:%M:%S.%f"), cid
+    cur.execute(f"""
+        SELECT ID, ID_MOTO, TEMP_C, VIB, BATT_PCT, TO_CHAR(TS,'YYYY-MM-DD HH24:MI:SS'),
+               TO_CHAR(TS,'YYYY-MM-DD HH24:MI:SS.FF6')
+        FROM T_IOT_TELEMETRIA
+        WHERE {" AND ".join(where)}
+        ORDER BY TS DESC, ID DESC
+        FETCH FIRST :lim ROWS ONLY
+    """, binds)
+    rows = [
+        {"id": r[0], "id_moto": r[1], "temp_c": r[2], "vib": r[3], "batt_pct": r[4], "ts": r[5], "_ts": r[6]}
+        for r in cur.fetchall()
+    ]
+    items, nxt = _page(rows, limit, "_ts")
+    for r in items:
+        del r["_ts"]
+    return items, nxt
+
+def list_telemetria_moto_file(id_moto: int, ts_from: Optional[datetime], ts_to: Optional[datetime],
+                              cursor: Optional[str], limit: int):
+    before = None
+    if cursor:
+        cts, cid = decode_cursor(cursor)
+        before = (cts.timestamp(), cid)
+    epoch = lambda d: int(d.timestamp()) if d is not None else None
+    if _binary_backend():
+        from services.telemetry_store import to_dicts
+        import numpy as np
+        recs = telemetry_store().query(id_moto, epoch(ts_from), epoch(ts_to))
+        if before is not None:
+            recs = recs[(recs["ts"] < before[0]) | ((recs["ts"] == before[0]) & (recs["id"] < before[1]))]
+        recs = recs[np.lexsort((recs["id"], recs["ts"]))[::-1][:limit + 1]]
+        return _page(to_dicts(recs), limit)
+    rows = IDX_TEL.query(id_moto, epoch(ts_from), epoch(ts_to), before, limit + 1)
+    return _page(rows, limit)
+
+# ------- AGREGAÇÃO (min/max/avg/last por bucket) -------
+_AGG_METRICS = ("temp_c", "vib", "batt_pct")
+
+def _bucket_sql(col: str, minutes: int) -> str:
+    """Início do bucket de `minutes` (divisor de 60) como DATE, no próprio banco."""
+    if minutes == 1:
+        return f"TRUNC(CAST({col} AS DATE), 'MI')"
+    return (f"(TRUNC(CAST({col} AS DATE), 'HH24') + "
+            f"FLOOR(TO_NUMBER(TO_CHAR({col}, 'MI')) / {minutes}) * {minutes} / 1440)")
+
+def _agg_rows(rows) -> List[Dict]:
+    """(bucket, count, [min, max, avg, last] x métrica) → formato da API."""
+    out = []
+    for r in rows:
+        item = {"bucket": r[0], "count": int(r[1])}
+        for i, m in enumerate(_AGG_METRICS):
+            vals = r[2 + 4 * i: 6 + 4 * i]
+            item[m] = {k: (round(float(v), 2) if v is not None else None)
+                       for k, v in zip(("min", "max", "avg", "last"), vals)}
+        out.append(item)
+    return out
+
+def aggregate_telemetria_db(cur, minutes: int, id_moto: Optional[int],
+                            ts_from: datetime, ts_to: datetime) -> List[Dict]:
+    """GROUP BY no Oracle: só os buckets voltam pela rede. `minutes` vem de BUCKETS
+    (nunca do usuário direto), por isso pode entrar literal no SQL."""
+    binds = {"f": ts_from, "t": ts_to}
+    filtro = ""
+    if id_moto is not None:
+        filtro, binds["m"] = "AND ID_MOTO = :m", id_moto
+    if TELEMETRY_ROLLUP:
+        # re-agrega o rollup de 1 minuto (T_IOT_TELEMETRIA_1M) em vez da tabela crua
+        b = _bucket_sql("BUCKET", minutes)
+        cols = ", ".join(
+            f"MIN(MIN_{m.upper()}), MAX(MAX_{m.upper()}), SUM(SUM_{m.upper()}) / SUM(N), "
+            f"MAX(LAST_{m.upper()}) KEEP (DENSE_RANK LAST ORDER BY LAST_TS)"
+            for m in _AGG_METRICS)
+        cur.execute(f"""
+            SELECT TO_CHAR({b}, 'YYYY-MM-DD HH24:MI:SS'), SUM(N), {cols}
+            FROM T_IOT_TELEMETRIA_1M
+            WHERE BUCKET >= TRUNC(:f, 'MI') AND BUCKET < :t {filtro}
+            GROUP BY {b}
+            ORDER BY {b}
+        """, binds)
+        return _agg_rows(cur.fetchall())
+    b = _bucket_sql("TS", minutes)
+    cols = ", ".join(
+        f"MIN({m.upper()}), MAX({m.upper()}), AVG({m.upper()}), "
+        f"MAX({m.upper()}) KEEP (DENSE_RANK LAST ORDER BY TS, ID)"
+        for m in _AGG_METRICS)
+    cur.execute(f"""
+        SELECT TO_CHAR({b}, 'YYYY-MM-DD HH24:MI:SS'), COUNT(*), {cols}
+        FROM T_IOT_TELEMETRIA
+        WHERE TS >= :f AND TS < :t {filtro}
+        GROUP BY {b}
+        ORDER BY {b}
+    """, binds)
+    return _agg_rows(cur.fetchall())
+
+def aggregate_telemetria_file(minutes: int, id_moto: Optional[int],
+                              ts_from: datetime, ts_to: datetime) -> List[Dict]:
+    """Mesma agregação sobre o fallback em arquivo, vetorizada com NumPy."""
+    import numpy as np
+    from services.telemetry_agg import aggregate
+    f, t = ts_from.timestamp(), ts_to.timestamp()
+    if _binary_backend():
+        recs = telemetry_store().query(id_moto, f, t)
+        return aggregate(recs["ts"], recs["id"], {m: recs[m] for m in _AGG_METRICS}, minutes)
+    rows = IDX_TEL.rows_between(id_moto, f, t)
+    if not rows:
+        return []
+    from services.telemetry_index import parse_ts
+    ts = np.fromiter((parse_ts(r["ts"]) for r in rows), dtype=np.int64, count=len(rows))
+    ids = np.fromiter((int(r["id"]) for r in rows), dtype=np.int64, count=len(rows))
+    values = {m: np.array([r[m] for r in rows], dtype=np.float64) for m in _AGG_METRICS}
+    return aggregate(ts, ids, values, minutes)
+
+def _rollup_grupos(itens) -> List[Dict]:
+    """Pré-agrega por chave (moto ou moto+minuto): um MERGE por grupo, não por leitura.
+    `itens`: (chave, id_moto, {métrica: valor}, binds extras); o último de cada grupo
+    vira LAST_*."""
+    grupos: Dict = {}
+    for chave, id_moto, v, extra in itens:
+        a = grupos.get(chave)
+        if a is None:
+            a = grupos[chave] = {"id_moto": id_moto, "n": 0}
+            for m in _AGG_METRICS:
+                a[f"s_{m}"], a[f"mn_{m}"], a[f"mx_{m}"] = 0.0, v[m], v[m]
+        a["n"] += 1
+        for m in _AGG_METRICS:
+            a[f"s_{m}"] += v[m]
+            a[f"mn_{m}"] = min(a[f"mn_{m}"], v[m])
+            a[f"mx_{m}"] = max(a[f"mx_{m}"], v[m])
+            a[f"l_{m}"] = v[m]
+        a.update(extra)
+    return list(grupos.values())
+
+def _rollup_merge(cur, binds: List[Dict], bucket_expr: str, ts_expr: str):
+    if not binds:
+        return
+    # LAST_* só muda se a leitura não for mais antiga que a última do bucket (replay)
+    sets = ", ".join(
+        f"r.SUM_{M} = r.SUM_{M} + :s_{m}, r.MIN_{M} = LEAST(r.MIN_{M}, :mn_{m}), "
+        f"r.MAX_{M} = GREATEST(r.MAX_{M}, :mx_{m}), "
+        f"r.LAST_{M} = CASE WHEN s.TS >= r.LAST_TS THEN :l_{m} ELSE r.LAST_{M} END"
+        for m, M in ((m, m.upper()) for m in _AGG_METRICS))
+    cols = ", ".join(f"SUM_{M}, MIN_{M}, MAX_{M}, LAST_{M}" for M in (m.upper() for m in _AGG_METRICS))
+    vals = ", ".join(f":s_{m}, :mn_{m}, :mx_{m}, :l_{m}" for m in _AGG_METRICS)
+    sql = f"""
+        MERGE INTO T_IOT_TELEMETRIA_1M r
+        USING (SELECT :id_moto ID_MOTO, {bucket_expr} BUCKET, {ts_expr} TS FROM DUAL) s
+        ON (r.ID_MOTO = s.ID_MOTO AND r.BUCKET = s.BUCKET)
+        WHEN MATCHED THEN UPDATE SET r.N = r.N + :n, {sets}, r.LAST_TS = GREATEST(r.LAST_TS, s.TS)
+        WHEN NOT MATCHED THEN INSERT (ID_MOTO, BUCKET, N, {cols}, LAST_TS)
+             VALUES (s.ID_MOTO, s.BUCKET, :n, {vals}, s.TS)
+    """
+    try:
+        cur.executemany(sql, binds)
+    except Exception as e:
+        # ORA-00001: outro writer inseriu o mesmo (moto, bucket) entre o ON e o INSERT.
+        # As linhas antes de `offset` já entraram e a que falhou foi desfeita; agora a
+        # linha do bucket existe, então o MERGE repetido cai no UPDATE.
+        err = e.args[0] if e.args else None
+        if getattr(err, "code", None) != 1:
+            raise
+        cur.executemany(sql, binds[err.offset:])
+
+def rollup_telemetria_db(cur, payloads):
+    """Atualiza o rollup de 1 minuto (T_IOT_TELEMETRIA_1M) na mesma transação do INSERT,
+    no minuto atual do banco."""
+    grupos = _rollup_grupos(
+        (p.id_moto, p.id_moto, {m: getattr(p, m) for m in _AGG_METRICS}, {}) for p in payloads)
+    _rollup_merge(cur, grupos, "TRUNC(SYSDATE, 'MI')", "SYSTIMESTAMP")
+
+def rollup_telemetria_replay_db(cur, rows: List[Dict]):
+    """Rollup das linhas que voltam do spool: cada uma no bucket do próprio ts
+    ("AAAA-MM-DD HH:MM:SS"), não no minuto em que o replay rodou."""
+    grupos = _rollup_grupos(
+        ((r["id_moto"], r["ts"][:16]), r["id_moto"], r, {"bucket": r["ts"][:16], "ts": r["ts"]})
+        for r in rows)
+    _rollup_merge(cur, grupos, "TO_DATE(:bucket, 'YYYY-MM-DD HH24:MI')", _TS_EXPR["ts"])
+
 # ------- COMANDOS -------
 def save_command_db(cur, payload) -> int:
-    cur.execute("SELECT NVL(MAX(ID),0)+1 FROM T_IOT_ACIONAMENTO")
-    new_id = cur.fetchone()[0]
-    cur.execute("""
-        INSERT INTO T_IOT_ACIONAMENTO (ID, ID_MOTO, KIND, REASON)
-        VALUES (:id, :id_moto, :kind, :reason)
-    """, dict(id=new_id, id_moto=payload.id_moto, kind=payload.kind, reason=payload.reason))
-    return new_id
+    return insert_with_id(cur, ID_CMD, "T_IOT_ACIONAMENTO", "ID", dict(
+        id_moto=payload.id_moto, kind=payload.kind, reason=payload.reason,
+    ))
 
 def save_command_file(payload) -> int:
-    next_id = 1
-    if os.path.exists(F_CMD):
-        with open(F_CMD, "r", encoding="utf-8") as f:
-            next_id = sum(1 for _ in f)
+    next_id = CNT_CMD.next_id()
     row = {
         "id": next_id,
         "id_moto": payload.id_moto,
@@ -106,17 +397,26 @@ def save_command_file(payload) -> int:
     _append_csv(F_CMD, HDR_CMD, row)
     return next_id
 
+def save_command_batch_db(cur, payloads) -> int:
+    return insert_many_with_ids(cur, ID_CMD, "T_IOT_ACIONAMENTO", "ID", [
+        dict(id_moto=p.id_moto, kind=p.kind, reason=p.reason) for p in payloads
+    ])
+
+def save_command_batch_file(payloads) -> int:
+    payloads = list(payloads)
+    if not payloads:
+        return 0
+    ids = CNT_CMD.next_ids(len(payloads))
+    ts = _now_str()
+    _append_csv_many(F_CMD, HDR_CMD, [
+        {"id": i, "id_moto": p.id_moto, "kind": p.kind, "reason": p.reason or "", "ts": ts}
+        for i, p in zip(ids, payloads)
+    ])
+    return len(payloads)
+
 # ------- DETECÇÕES -------
 def save_detection_db(cur, payload) -> int:
-    cur.execute("SELECT NVL(MAX(ID),0)+1 FROM T_IOT_DETECCAO")
-    new_id = cur.fetchone()[0]
-    cur.execute("""
-        INSERT INTO T_IOT_DETECCAO
-          (ID, SOURCE, LABEL, CONF, X, Y, W, H, FRAME_ID, ID_MOTO, REGION)
-        VALUES
-          (:id, :source, :label, :conf, :x, :y, :w, :h, :frame_id, :id_moto, :region)
-    """, {
-        "id": new_id,
+    return insert_with_id(cur, ID_DET, "T_IOT_DETECCAO", "ID", {
         "source": payload.source,
         "label": payload.label,
         "conf": payload.conf,
@@ -125,13 +425,9 @@ def save_detection_db(cur, payload) -> int:
         "id_moto": payload.id_moto,
         "region": payload.region
     })
-    return new_id
 
 def save_detection_file(payload) -> int:
-    next_id = 1
-    if os.path.exists(F_DET):
-        with open(F_DET, "r", encoding="utf-8") as f:
-            next_id = sum(1 for _ in f)
+    next_id = CNT_DET.next_id()
     row = {
         "id": next_id,
         "source": payload.source,
@@ -145,3 +441,98 @@ def save_detection_file(payload) -> int:
     }
     _append_csv(F_DET, HDR_DET, row)
     return next_id
+
+def save_detection_batch_db(cur, payloads) -> int:
+    """Quadro inteiro (ou lote do MQTT) num único executemany."""
+    return insert_many_with_ids(cur, ID_DET, "T_IOT_DETECCAO", "ID", [
+        dict(source=p.source, label=p.label, conf=p.conf, x=p.x, y=p.y, w=p.w, h=p.h,
+             frame_id=p.frame_id, id_moto=p.id_moto, region=p.region)
+        for p in payloads
+    ])
+
+def save_detection_batch_file(payloads) -> int:
+    payloads = list(payloads)
+    if not payloads:
+        return 0
+    ids = CNT_DET.next_ids(len(payloads))
+    ts = _now_str()
+    _append_csv_many(F_DET, HDR_DET, [
+        {"id": i, "source": p.source, "label": p.label, "conf": p.conf,
+         "x": p.x, "y": p.y, "w": p.w, "h": p.h,
+         "frame_id": p.frame_id if p.frame_id is not None else "",
+         "id_moto": p.id_moto if p.id_moto is not None else "",
+         "region": p.region or "", "ts": ts}
+        for i, p in zip(ids, payloads)
+    ])
+    return len(payloads)
+
+# ------- MOTOS (T_IOT_MOTO) -------
+def save_moto_db(cur, placa: str, modelo: str, area: int) -> int:
+    return insert_with_id(cur, ID_MOTO, "T_IOT_MOTO", "ID_MOTO", dict(
+        ds_placa=placa, nm_modelo=modelo, id_area=area,
+    ))
+
+def save_motos_batch_db(cur, motos) -> List[int]:
+    """Cadastro em lote (executemany). Devolve os IDs na ordem de entrada."""
+    return insert_many_returning_ids(cur, ID_MOTO, "T_IOT_MOTO", "ID_MOTO", [
+        dict(ds_placa=m.placa, nm_modelo=m.modelo, id_area=m.area) for m in motos
+    ])
+
+def update_motos_batch_db(cur, motos) -> List[int]:
+    """UPDATE em lote num único executemany. Devolve os IDs que não existem."""
+    motos = list(motos)
+    if not motos:
+        return []
+    cur.executemany("""
+        UPDATE T_IOT_MOTO
+           SET DS_PLACA = :placa, NM_MODELO = :modelo, ID_AREA = :area
+         WHERE ID_MOTO = :id
+    """, [dict(id=m.id, placa=m.placa, modelo=m.modelo, area=m.area) for m in motos],
+        arraydmlrowcounts=True)
+    return [m.id for m, n in zip(motos, cur.getarraydmlrowcounts()) if n == 0]
+
+# ------- REPLAY DO SPOOL (CSV → Oracle) -------
+# Linhas do CSV de fallback voltam ao Oracle via MERGE na coluna SPOOL_ORIGEM (posição
+# da linha no spool, ver services/spool_replayer.py; índice único em sql/spool_dedupe.sql):
+# reenviar o mesmo lote (ex.: queda antes do checkpoint) não duplica nada, e linhas
+# iguais de verdade (mesmo lote, mesmo ts) continuam sendo linhas distintas.
+_TS_EXPR = {"ts": "TO_TIMESTAMP(:ts, 'YYYY-MM-DD HH24:MI:SS')"}
+_ORIGEM = "spool_origem"
+
+def _num(v, cast):
+    return cast(v) if v not in (None, "") else None
+
+def _convert(rows: List[Dict], fn) -> List[Dict]:
+    """Converte as linhas do CSV; linha corrompida é descartada (senão travaria o replay)."""
+    out = []
+    for r in rows:
+        try:
+            out.append(dict(fn(r), spool_origem=r["_origem"]))
+        except (KeyError, TypeError, ValueError) as e:
+            print("⚠️ Linha inválida no spool, ignorada:", r, e)
+    return out
+
+def replay_telemetria_db(cur, rows: List[Dict]) -> int:
+    rows = _convert(rows, lambda r: dict(
+        id_moto=int(r["id_moto"]), temp_c=float(r["temp_c"]), vib=float(r["vib"]),
+        batt_pct=float(r["batt_pct"]), ts=r["ts"],
+    ))
+    n = merge_many_with_ids(cur, ID_TEL, "T_IOT_TELEMETRIA", "ID", rows, _ORIGEM, _TS_EXPR)
+    if TELEMETRY_ROLLUP and n:
+        # só as linhas que o MERGE inseriu (contagem por linha do executemany): reenviar
+        # um lote não soma de novo no rollup
+        rollup_telemetria_replay_db(cur, [r for r, k in zip(rows, cur.getarraydmlrowcounts()) if k])
+    return n
+
+def replay_command_db(cur, rows: List[Dict]) -> int:
+    return merge_many_with_ids(cur, ID_CMD, "T_IOT_ACIONAMENTO", "ID", _convert(rows, lambda r: dict(
+        id_moto=int(r["id_moto"]), kind=r["kind"], reason=r["reason"] or None, ts=r["ts"],
+    )), _ORIGEM, _TS_EXPR)
+
+def replay_detection_db(cur, rows: List[Dict]) -> int:
+    return merge_many_with_ids(cur, ID_DET, "T_IOT_DETECCAO", "ID", _convert(rows, lambda r: dict(
+        source=r["source"], label=r["label"], conf=float(r["conf"]),
+        x=int(r["x"]), y=int(r["y"]), w=int(r["w"]), h=int(r["h"]),
+        frame_id=_num(r["frame_id"], int), id_moto=_num(r["id_moto"], int),
+        region=r["region"] or None, ts=r["ts"],
+    )), _ORIGEM, _TS_EXPR)
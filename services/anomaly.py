@@ -0,0 +1,140 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from config import (
+    ANOMALY_ENABLED, ANOMALY_ALPHA, ANOMALY_Z, ANOMALY_WARMUP,
+    ANOMALY_BATT_DROP_PCT_MIN, ANOMALY_COOLDOWN_S, ANOMALY_ACTIONS,
+    FLEET_TEMP_MAX, FLEET_BATT_MIN,
+)
+
+# -------------------------------------------------------
+# Detecção de anomalias no caminho de ingestão (POST /telemetria e MQTT)
+#
+# Por moto ficam só alguns números (EWMA e variância de temp/vib, última bateria,
+# taxa de queda da bateria): memória O(1) por moto e nenhuma leitura de banco por
+# mensagem. Alertas:
+#   temp_alta         temp > FLEET_TEMP_MAX, ou z-score da temp > ANOMALY_Z
+#   vib_anomala       z-score da vibração > ANOMALY_Z
+#   bateria_critica   bateria < FLEET_BATT_MIN
+#   bateria_drenando  queda média > ANOMALY_BATT_DROP_PCT_MIN %/min
+# Cada (moto, tipo) só alerta de novo depois de ANOMALY_COOLDOWN_S.
+# -------------------------------------------------------
+class _Ewma:
+    __slots__ = ("mean", "var")
+
+    def __init__(self, x: float):
+        self.mean, self.var = x, 0.0
+
+    def update(self, x: float, alpha: float) -> float:
+        """Atualiza e devolve o z-score de x contra o estado anterior."""
+        d = x - self.mean
+        z = d / math.sqrt(self.var) if self.var > 0 else 0.0
+        self.mean += alpha * d
+        self.var = (1 - alpha) * (self.var + alpha * d * d)
+        return z
+
+
+class _MotoStats:
+    __slots__ = ("n", "temp", "vib", "batt", "t", "drop", "alerted")
+
+    def __init__(self, temp_c: float, vib: float, batt_pct: float, t: float):
+        self.n = 1
+        self.temp, self.vib = _Ewma(temp_c), _Ewma(vib)
+        self.batt, self.t = batt_pct, t
+        self.drop = 0.0                      # %/min, média exponencial
+        self.alerted: Dict[str, float] = {}  # tipo → último alerta (cooldown)
+
+
+def parse_actions(spec: str) -> Dict[str, str]:
+    """"temp_alta:lock,bateria_drenando:horn" → {"temp_alta": "lock", ...}"""
+    out = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        kind, _, cmd = item.partition(":")
+        if cmd:
+            out[kind.strip()] = cmd.strip()
+    return out
+
+
+class AnomalyDetector:
+    def __init__(self, alpha: float = ANOMALY_ALPHA, z: float = ANOMALY_Z, warmup: int = ANOMALY_WARMUP,
+                 batt_drop: float = ANOMALY_BATT_DROP_PCT_MIN, cooldown_s: float = ANOMALY_COOLDOWN_S,
+                 history: int = 500):
+        self.alpha, self.z, self.warmup = alpha, z, warmup
+        self.batt_drop, self.cooldown_s = batt_drop, cooldown_s
+        self._stats: Dict[int, _MotoStats] = {}
+        self._lock = threading.Lock()
+        self._handlers: List[Callable[[dict], None]] = []
+        self.recent = deque(maxlen=history)
+        self._m = {"observed": 0, "alerts": 0, "handler_errors": 0}
+
+    def add_handler(self, fn: Callable[[dict], None]):
+        """fn(alerta) é chamado para cada alerta emitido (deve ser rápido e não bloquear)."""
+        self._handlers.append(fn)
+
+    def observe(self, id_moto: int, temp_c: float, vib: float, batt_pct: float,
+                t: Optional[float] = None) -> List[dict]:
+        t = time.time() if t is None else t
+        with self._lock:
+            self._m["observed"] += 1
+            s = self._stats.get(id_moto)
+            if s is None:
+                self._stats[id_moto] = s = _MotoStats(temp_c, vib, batt_pct, t)
+                z_temp = z_vib = 0.0
+            else:
+                s.n += 1
+                z_temp = s.temp.update(temp_c, self.alpha)
+                z_vib = s.vib.update(vib, self.alpha)
+                dt_min = (t - s.t) / 60
+                if dt_min > 0:
+                    s.drop += self.alpha * ((s.batt - batt_pct) / dt_min - s.drop)
+                s.batt, s.t = batt_pct, t
+
+            aquecido = s.n > self.warmup
+            candidatos = []
+            if temp_c > FLEET_TEMP_MAX or (aquecido and z_temp > self.z):
+                candidatos.append(("temp_alta", temp_c, f"temp {temp_c:.1f}°C (média {s.temp.mean:.1f}, z={z_temp:.1f})"))
+            if aquecido and z_vib > self.z:
+                candidatos.append(("vib_anomala", vib, f"vib {vib:.2f} (média {s.vib.mean:.2f}, z={z_vib:.1f})"))
+            if batt_pct < FLEET_BATT_MIN:
+                candidatos.append(("bateria_critica", batt_pct, f"bateria {batt_pct:.1f}%"))
+            if aquecido and s.drop > self.batt_drop:
+                candidatos.append(("bateria_drenando", s.drop, f"bateria caindo {s.drop:.1f}%/min"))
+
+            alertas = []
+            for kind, value, detail in candidatos:
+                if t - s.alerted.get(kind, -math.inf) < self.cooldown_s:
+                    continue
+                s.alerted[kind] = t
+                alertas.append({
+                    "id_moto": id_moto, "kind": kind, "value": round(float(value), 2), "detail": detail,
+                    "ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)),
+                })
+            self._m["alerts"] += len(alertas)
+            self.recent.extend(alertas)
+
+        for alerta in alertas:
+            for fn in self._handlers:
+                try:
+                    fn(alerta)
+                except Exception as e:
+                    self._m["handler_errors"] += 1
+                    print("⚠️ Falha ao tratar alerta:", alerta["kind"], e)
+        return alertas
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {"motos": len(self._stats), **self._m}
+
+
+detector = AnomalyDetector()
+actions = parse_actions(ANOMALY_ACTIONS)   # tipo de alerta → comando automático
+
+
+def observe(payload) -> List[dict]:
+    """Atalho para os caminhos de ingestão (objeto com id_moto/temp_c/vib/batt_pct)."""
+    if not ANOMALY_ENABLED:
+        return []
+    return detector.observe(payload.id_moto, payload.temp_c, payload.vib, payload.batt_pct)
@@ -0,0 +1,34 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from config import API_IO_MODE, DB_EXECUTOR_WORKERS
+
+# -------------------------------------------------------
+# Modo de I/O das rotas (API_IO_MODE=sync|async)
+#
+# sync  → rotas `def`; o FastAPI roda cada uma numa thread do threadpool do
+#         anyio, que fica presa enquanto o Oracle responde.
+# async → rotas `async def`; o trabalho bloqueante vai para um executor
+#         dedicado do tamanho do pool Oracle. Requisições excedentes esperam
+#         como futures no event loop, não como threads.
+# -------------------------------------------------------
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="oracle")
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
+
+def io_route(fn):
+    """Decorador para rotas com I/O bloqueante: no modo async vira `async def`
+    delegando ao executor do Oracle; no modo sync devolve a própria função."""
+    if API_IO_MODE != "async":
+        return fn
+
+    @functools.wraps(fn)
+    async def _async(*args, **kwargs):
+        return await run_db(fn, *args, **kwargs)
+    return _async
+
+def shutdown():
+    db_executor.shutdown(wait=False)
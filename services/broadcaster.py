@@ -0,0 +1,38 @@
+import asyncio
+from typing import Callable, Optional, Set
+
+# -------------------------------------------------------
+# Fan-out único para os clientes do dashboard (SSE).
+# Cada mensagem é serializada uma vez e entregue a todas as filas.
+# -------------------------------------------------------
+class Broadcaster:
+    def __init__(self, resync: Optional[Callable[[], str]] = None, client_queue: int = 100):
+        self._clients: Set[asyncio.Queue] = set()
+        self._resync = resync            # snapshot completo para clientes atrasados
+        self._client_queue = client_queue
+        self.published = 0
+        self.resyncs = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        q = asyncio.Queue(maxsize=self._client_queue)
+        self._clients.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        self._clients.discard(q)
+
+    def publish(self, msg: str):
+        """Chamado no event loop. Nunca bloqueia: cliente lento recebe um snapshot completo."""
+        self.published += 1
+        for q in list(self._clients):
+            try:
+                q.put_nowait(msg)
+            except asyncio.QueueFull:
+                while not q.empty():
+                    q.get_nowait()
+                if self._resync is not None:
+                    q.put_nowait(self._resync())
+                    self.resyncs += 1
+
+    def __len__(self):
+        return len(self._clients)
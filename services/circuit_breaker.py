@@ -0,0 +1,83 @@
+import threading
+import time
+
+# -------------------------------------------------------
+# Circuit breaker: depois de N falhas seguidas o circuito abre e as chamadas
+# falham na hora (CircuitOpenError) até `reset_timeout_s` passar. Aí uma única
+# chamada de teste (half-open) é liberada: sucesso fecha, falha reabre. Quem
+# recebe a vaga de teste devolve com release_probe() ao terminar, mesmo sem
+# resultado (ex.: pool saturado), senão o circuito ficaria em half-open para sempre.
+# -------------------------------------------------------
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout_s: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._m = {"opens": 0, "short_circuited": 0, "probes": 0}
+
+    def _admit(self):
+        """None = recusada; False = circuito fechado; True = é a chamada de teste."""
+        with self._lock:
+            if self._state == CLOSED:
+                return False
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._m["probes"] += 1
+                return True
+            self._m["short_circuited"] += 1
+            return None
+
+    def allow(self) -> bool:
+        return self._admit() is not None
+
+    def check(self) -> bool:
+        """Levanta CircuitOpenError se a chamada não deve nem ser tentada.
+        Devolve True se esta é a chamada de teste (liberar depois com release_probe())."""
+        probe = self._admit()
+        if probe is None:
+            raise CircuitOpenError(f"circuito {self.name} aberto")
+        return probe
+
+    def release_probe(self):
+        """Libera a vaga de teste; sem record_*, a próxima chamada vira o novo teste."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"Circuito {self.name} fechado (recuperado).")
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._m["opens"] += 1
+                    print(f"Circuito {self.name} aberto após {self._failures} falha(s).")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"state": self._state, "consecutive_failures": self._failures, **self._m}
@@ -0,0 +1,38 @@
+import os
+from typing import List
+
+# -------------------------------------------------------
+# Leitura do fim de arquivos append-only (CSV) sem varrer o arquivo todo
+# -------------------------------------------------------
+BLOCK = 64 * 1024
+
+def read_header(path: str) -> str:
+    """Primeira linha do arquivo (cabeçalho do CSV), sem o \\n."""
+    with open(path, "rb") as f:
+        return f.readline().decode("utf-8-sig").rstrip("\r\n")
+
+def last_lines(path: str, n: int, block: int = BLOCK) -> List[str]:
+    """Últimas n linhas não vazias (mais recente primeiro), lendo blocos do fim para o início.
+    Nunca devolve a 1ª linha do arquivo (cabeçalho)."""
+    if n <= 0 or not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        header_len = len(f.readline())
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        resto = b""
+        out: List[str] = []
+        while pos > header_len and len(out) < n:
+            step = min(block, pos - header_len)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + resto
+            linhas = buf.split(b"\n")
+            # a 1ª parte pode ser uma linha cortada: guarda para o próximo bloco
+            resto = linhas.pop(0) if pos > header_len else b""
+            for linha in reversed(linhas):
+                if linha.strip():
+                    out.append(linha.decode("utf-8").rstrip("\r"))
+                    if len(out) == n:
+                        break
+        return out
@@ -0,0 +1,67 @@
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from config import DETECTION_MIN_CONF, DETECTION_LABELS, DETECTION_MIN_CONF_BY_LABEL
+
+# -------------------------------------------------------
+# Filtro de ruído das detecções de visão (antes de chegar ao banco/CSV)
+#
+# Uma fonte YOLO/ArUco manda dezenas de caixas por quadro; as de confiança
+# baixa ou de classes que não interessam ao pátio são descartadas aqui, no
+# caminho de ingestão (POST /deteccoes, /deteccoes/batch e MQTT).
+#   DETECTION_MIN_CONF            confiança mínima geral (0 = aceita tudo)
+#   DETECTION_LABELS              "moto,capacete" → só essas classes (vazio = todas)
+#   DETECTION_MIN_CONF_BY_LABEL   "capacete:0.6,pessoa:0.8" → mínimo por classe
+# -------------------------------------------------------
+def parse_min_conf(spec: str) -> Dict[str, float]:
+    """"capacete:0.6,pessoa:0.8" → {"capacete": 0.6, "pessoa": 0.8}"""
+    out = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        label, _, conf = item.partition(":")
+        if conf:
+            out[label.strip().lower()] = float(conf)
+    return out
+
+
+class DetectionFilter:
+    def __init__(self, min_conf: float = DETECTION_MIN_CONF, labels: str = DETECTION_LABELS,
+                 min_conf_by_label: str = DETECTION_MIN_CONF_BY_LABEL):
+        self.min_conf = min_conf
+        self.labels = frozenset(l.strip().lower() for l in labels.split(",") if l.strip())
+        self.min_conf_by_label = parse_min_conf(min_conf_by_label)
+        self._lock = threading.Lock()
+        self._m = {"accepted": 0, "dropped_conf": 0, "dropped_label": 0}
+
+    def _motivo(self, label: str, conf: float):
+        label = label.lower()
+        if self.labels and label not in self.labels:
+            return "dropped_label"
+        if conf < self.min_conf_by_label.get(label, self.min_conf):
+            return "dropped_conf"
+        return None
+
+    def split(self, payloads: Iterable) -> Tuple[List, int]:
+        """(detecções aceitas, quantas foram descartadas)."""
+        aceitas, cont = [], {"dropped_conf": 0, "dropped_label": 0}
+        for p in payloads:
+            motivo = self._motivo(p.label, p.conf)
+            if motivo is None:
+                aceitas.append(p)
+            else:
+                cont[motivo] += 1
+        with self._lock:
+            self._m["accepted"] += len(aceitas)
+            for k, v in cont.items():
+                self._m[k] += v
+        return aceitas, sum(cont.values())
+
+    def accepts(self, payload) -> bool:
+        return bool(self.split([payload])[0])
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {"min_conf": self.min_conf, "labels": sorted(self.labels),
+                    "min_conf_by_label": self.min_conf_by_label, **self._m}
+
+
+detection_filter = DetectionFilter()
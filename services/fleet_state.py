@@ -0,0 +1,175 @@
+import csv
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+# -------------------------------------------------------
+# Estado atual da frota (última leitura por id_moto), em memória.
+# Atualizado de forma incremental:
+#   - seguindo o CSV do simulador a partir do último byte lido
+#   - direto pelos caminhos de ingestão (POST /telemetria, MQTT)
+# -------------------------------------------------------
+POSSIBLE_PATHS = [
+    os.path.join("data", "telemetria.csv"),
+    os.path.join(os.getcwd(), "data", "telemetria.csv"),
+    os.path.join(os.getcwd(), "Sprint1_IOT-main", "data", "telemetria.csv"),
+]
+READ_CHUNK = 4 * 1024 * 1024
+
+class FleetState:
+    def __init__(self, paths: List[str] = POSSIBLE_PATHS):
+        self._paths = paths
+        self._motos: Dict[int, dict] = {}
+        self._changed: Set[int] = set()  # ids alterados desde o último take_changes()
+        self.version = 0                   # sobe a cada mudança (ETag de /dashboard/data)
+        self._zone_versions: Dict[str, int] = {}  # zona (minúscula) → versão da última mudança
+        self._by_zone: Dict[str, Dict[int, dict]] = {}  # zona (minúscula) → motos da zona
+        self._zone_names: Dict[str, str] = {}     # zona (minúscula) → nome como chegou
+        self._lock = threading.Lock()
+        self._path: Optional[str] = None
+        self._offset = 0
+        self._header: Optional[List[str]] = None
+        self._stop = threading.Event()
+        self._th = None
+
+    # ---- atualização direta (ingestão) ----
+    def update(self, id_moto: int, temp_c: float, vib: float, batt_pct: float,
+               zona: Optional[str] = None, timestamp: str = ""):
+        timestamp = timestamp or time.strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._set(id_moto, temp_c, vib, batt_pct, zona, timestamp)
+
+    def _set(self, id_moto, temp_c, vib, batt_pct, zona, timestamp):
+        atual = self._motos.get(id_moto)
+        if zona is None:
+            zona = atual["zona"] if atual else "Desconhecida"
+        novo = {
+            "id_moto": id_moto,
+            "temp_c": temp_c,
+            "vib": vib,
+            "batt_pct": batt_pct,
+            "zona": zona,
+            "timestamp": timestamp,
+        }
+        if novo != atual:
+            self._motos[id_moto] = novo
+            self._changed.add(id_moto)
+            self.version += 1
+            chave = str(zona).lower()
+            if atual:
+                antiga = str(atual["zona"]).lower()
+                if antiga != chave:
+                    self._by_zone[antiga].pop(id_moto, None)
+                    self._zone_versions[antiga] = self.version
+            self._by_zone.setdefault(chave, {})[id_moto] = novo
+            self._zone_names.setdefault(chave, str(zona))
+            self._zone_versions[chave] = self.version
+
+    # ---- seguidor do CSV ----
+    def _apply_row(self, row: dict):
+        try:
+            self._set(
+                int(row.get("id_moto", 0)),
+                float(row.get("temp_c", 0)),
+                float(row.get("vib", 0)),
+                float(row.get("batt_pct", 0)),
+                row.get("zona") or "Desconhecida",
+                row.get("timestamp") or row.get("ts", ""),
+            )
+        except Exception as e:
+            print("⚠️ Linha inválida no CSV:", e)
+
+    def refresh(self):
+        """Lê só os bytes novos desde a última chamada."""
+        if self._path is None:
+            self._path = next((p for p in self._paths if os.path.exists(p)), None)
+            if self._path is None:
+                return
+        try:
+            size = os.path.getsize(self._path)
+        except OSError:
+            return
+        if size < self._offset:
+            # arquivo truncado/recriado: recomeça do início
+            self._offset, self._header = 0, None
+        if size == self._offset:
+            return
+        with open(self._path, "rb") as f:
+            f.seek(self._offset)
+            while self._offset < size:
+                chunk = f.read(min(READ_CHUNK, size - self._offset))
+                fim = chunk.rfind(b"\n")
+                if fim < 0:
+                    if len(chunk) < READ_CHUNK:
+                        return  # linha ainda incompleta
+                    fim = len(chunk) - 1  # linha maior que o bloco: descarta
+                f.seek(self._offset + fim + 1)
+                linhas = chunk[:fim + 1].decode("utf-8-sig", errors="replace").splitlines()
+                with self._lock:
+                    self._offset += fim + 1
+                    rows = csv.reader(linhas)
+                    if self._header is None:
+                        self._header = next(rows, None)
+                    for row in rows:
+                        if row:
+                            self._apply_row(dict(zip(self._header, row)))
+
+    def follow(self, interval_s: float = 2.0):
+        """Thread que segue o CSV em background."""
+        if self._th is not None and self._th.is_alive():
+            return
+        self._stop.clear()
+
+        def _loop():
+            while not self._stop.is_set():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print("⚠️ Falha ao seguir telemetria.csv:", e)
+                self._stop.wait(interval_s)
+
+        self._th = threading.Thread(target=_loop, name="fleet-follow", daemon=True)
+        self._th.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ---- leitura ----
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [dict(v) for v in self._motos.values()]
+
+    def get(self, id_moto: int) -> Optional[dict]:
+        with self._lock:
+            v = self._motos.get(id_moto)
+            return dict(v) if v else None
+
+    def take_changes(self) -> List[dict]:
+        """Estados alterados desde a última chamada (para o push do dashboard)."""
+        with self._lock:
+            ids, self._changed = self._changed, set()
+            return [dict(self._motos[i]) for i in ids]
+
+    def zone_version(self, zona: str) -> int:
+        return self._zone_versions.get(zona.lower(), 0)
+
+    def zones(self) -> Dict[str, dict]:
+        """zona (minúscula) → {"nome", "total"}, sem percorrer as motos."""
+        with self._lock:
+            return {k: {"nome": self._zone_names[k], "total": len(v)}
+                    for k, v in self._by_zone.items() if v}
+
+    def snapshot_zona(self, zona: str, offset: int = 0, limit: Optional[int] = None) -> List[dict]:
+        """Motos de uma zona por id_moto, paginadas. Custo proporcional à zona, não à frota."""
+        with self._lock:
+            motos = self._by_zone.get(zona.lower(), {})
+            ids = sorted(motos)
+            fim = None if limit is None else offset + limit
+            return [dict(motos[i]) for i in ids[offset:fim]]
+
+    def __len__(self):
+        return len(self._motos)
+
+
+fleet = FleetState()
@@ -0,0 +1,70 @@
+from typing import Dict, List
+
+import numpy as np
+
+from config import FLEET_BATT_MIN, FLEET_TEMP_MAX, FLEET_VIB_USE
+
+# -------------------------------------------------------
+# Classificação de status da frota (regra única para API e dashboard)
+#
+# manutencao: bateria < FLEET_BATT_MIN ou temperatura > FLEET_TEMP_MAX
+# em_uso:     vibração > FLEET_VIB_USE
+# parada:     o resto
+#
+# A frota inteira é classificada de uma vez sobre vetores NumPy (np.select),
+# em vez de um if por moto.
+# -------------------------------------------------------
+STATUS = ("manutencao", "em_uso", "parada")   # o índice é o código do status
+LABELS = {"manutencao": "manutenção", "em_uso": "em uso", "parada": "parada"}
+CSS = {"manutencao": "maint", "em_uso": "use", "parada": "stop"}
+
+
+def thresholds() -> Dict[str, float]:
+    return {"batt_min": FLEET_BATT_MIN, "temp_max": FLEET_TEMP_MAX, "vib_use": FLEET_VIB_USE}
+
+
+def classify(temp_c: np.ndarray, vib: np.ndarray, batt_pct: np.ndarray) -> np.ndarray:
+    """Códigos de status (índices de STATUS), um por posição dos vetores."""
+    return np.select(
+        [(batt_pct < FLEET_BATT_MIN) | (temp_c > FLEET_TEMP_MAX), vib > FLEET_VIB_USE],
+        [0, 1],
+        default=2,
+    ).astype(np.int8)
+
+
+def _columns(motos: List[dict]):
+    n = len(motos)
+    col = lambda k, d: np.fromiter((float(m.get(k, d)) for m in motos), dtype=np.float64, count=n)
+    return col("temp_c", 25), col("vib", 0), col("batt_pct", 100)
+
+
+def classify_motos(motos: List[dict]) -> np.ndarray:
+    if not motos:
+        return np.empty(0, dtype=np.int8)
+    return classify(*_columns(motos))
+
+
+def annotate(motos: List[dict]) -> List[dict]:
+    """Acrescenta "status" a cada dict (in place) e devolve a lista."""
+    for m, c in zip(motos, classify_motos(motos)):
+        m["status"] = STATUS[c]
+    return motos
+
+
+def summary(motos: List[dict]) -> Dict:
+    """Contagem por status e por zona x status."""
+    codes = classify_motos(motos)
+    zonas, zona_idx = np.unique(np.array([m.get("zona") or "Desconhecida" for m in motos], dtype=object),
+                                return_inverse=True)
+    por_status = np.bincount(codes, minlength=len(STATUS))
+    por_zona = np.bincount(zona_idx * len(STATUS) + codes,
+                           minlength=len(zonas) * len(STATUS)).reshape(len(zonas), len(STATUS))
+    return {
+        "total": len(motos),
+        "por_status": {s: int(por_status[i]) for i, s in enumerate(STATUS)},
+        "por_zona": {
+            str(z): {s: int(por_zona[j, i]) for i, s in enumerate(STATUS)}
+            for j, z in enumerate(zonas)
+        },
+        "thresholds": thresholds(),
+    }
@@ -0,0 +1,248 @@
+import os
+import threading
+from typing import List
+
+from services.csv_tail import read_header, last_lines
+
+# -------------------------------------------------------
+# Alocadores de ID (substituem o SELECT NVL(MAX(ID),0)+1)
+#
+#   sequence → sequence Oracle com INCREMENT BY <bloco> (hi/lo): cada NEXTVAL
+#              reserva um bloco inteiro de IDs; os demais saem da memória.
+#   identity → coluna IDENTITY; o INSERT devolve o ID via RETURNING INTO.
+#   max      → comportamento antigo (só para schemas sem sequence).
+#
+# DDL das sequences: sql/id_sequences.sql
+# -------------------------------------------------------
+
+class SequenceAllocator:
+    identity = False
+
+    def __init__(self, sequence: str, block: int):
+        self.sequence = sequence
+        self.block = block
+        self._next = 0
+        self._end = 0  # exclusivo
+        self._lock = threading.Lock()
+
+    def next_ids(self, cur, n: int = 1) -> List[int]:
+        with self._lock:
+            ids: List[int] = []
+            while len(ids) < n:
+                if self._next >= self._end:
+                    # busca todos os blocos que faltam num único round trip
+                    faltam = n - len(ids)
+                    blocos = -(-faltam // self.block)
+                    cur.execute(
+                        f"SELECT {self.sequence}.NEXTVAL FROM DUAL CONNECT BY LEVEL <= :k",
+                        dict(k=blocos),
+                    )
+                    for (hi,) in cur.fetchall():
+                        take = min(n - len(ids), self.block)
+                        ids.extend(range(hi, hi + take))
+                        # sobra do último bloco fica reservada para as próximas chamadas
+                        self._next, self._end = hi + take, hi + self.block
+                    continue
+                take = min(n - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+            return ids
+
+    def next_id(self, cur) -> int:
+        return self.next_ids(cur, 1)[0]
+
+
+class IdentityAllocator:
+    """Marcador: o banco gera o ID (coluna IDENTITY) e o INSERT usa RETURNING INTO."""
+    identity = True
+
+    def next_ids(self, cur, n: int = 1):
+        raise RuntimeError("IdentityAllocator não pré-aloca IDs; use RETURNING INTO")
+
+    def next_id(self, cur):
+        return self.next_ids(cur, 1)
+
+
+class MaxIdAllocator:
+    """Legado: SELECT NVL(MAX(ID),0)+1. Não é seguro com escritores concorrentes."""
+    identity = False
+
+    def __init__(self, table: str, id_col: str):
+        self.table = table
+        self.id_col = id_col
+
+    def next_ids(self, cur, n: int = 1) -> List[int]:
+        cur.execute(f"SELECT NVL(MAX({self.id_col}),0)+1 FROM {self.table}")
+        first = cur.fetchone()[0]
+        return list(range(first, first + n))
+
+    def next_id(self, cur) -> int:
+        return self.next_ids(cur, 1)[0]
+
+
+def make_allocator(strategy: str, sequence: str, table: str, id_col: str, block: int):
+    strategy = (strategy or "sequence").lower()
+    if strategy == "sequence":
+        return SequenceAllocator(sequence, block)
+    if strategy == "identity":
+        return IdentityAllocator()
+    if strategy == "max":
+        return MaxIdAllocator(table, id_col)
+    raise ValueError(f"ORACLE_ID_STRATEGY inválida: {strategy}")
+
+
+def insert_with_id(cur, alloc, table: str, id_col: str, values: dict) -> int:
+    """INSERT de uma linha com ID vindo do alocador. Um round trip (amortizado)."""
+    cols = list(values)
+    if alloc.identity:
+        out = cur.var(int)
+        cur.execute(
+            f"INSERT INTO {table} ({', '.join(c.upper() for c in cols)}) "
+            f"VALUES ({', '.join(':' + c for c in cols)}) "
+            f"RETURNING {id_col} INTO :new_id",
+            dict(values, new_id=out),
+        )
+        return int(out.getvalue()[0])
+    new_id = alloc.next_id(cur)
+    cur.execute(
+        f"INSERT INTO {table} ({id_col}, {', '.join(c.upper() for c in cols)}) "
+        f"VALUES (:new_id, {', '.join(':' + c for c in cols)})",
+        dict(values, new_id=new_id),
+    )
+    return new_id
+
+
+def insert_many_with_ids(cur, alloc, table: str, id_col: str, rows: List[dict]) -> int:
+    """INSERT em lote (executemany). IDs do lote são reservados de uma vez."""
+    if not rows:
+        return 0
+    cols = list(rows[0])
+    col_sql = ", ".join(c.upper() for c in cols)
+    bind_sql = ", ".join(":" + c for c in cols)
+    if alloc.identity:
+        cur.executemany(f"INSERT INTO {table} ({col_sql}) VALUES ({bind_sql})", rows)
+    else:
+        ids = alloc.next_ids(cur, len(rows))
+        cur.executemany(
+            f"INSERT INTO {table} ({id_col}, {col_sql}) VALUES (:new_id, {bind_sql})",
+            [dict(r, new_id=i) for r, i in zip(rows, ids)],
+        )
+    return len(rows)
+
+
+def insert_many_returning_ids(cur, alloc, table: str, id_col: str, rows: List[dict]) -> List[int]:
+    """Como insert_many_with_ids, mas devolve o ID de cada linha (na ordem de `rows`).
+    Com identity, os IDs voltam num único executemany via RETURNING INTO."""
+    if not rows:
+        return []
+    cols = list(rows[0])
+    col_sql = ", ".join(c.upper() for c in cols)
+    bind_sql = ", ".join(":" + c for c in cols)
+    if alloc.identity:
+        out = cur.var(int, arraysize=len(rows))
+        cur.setinputsizes(new_id=out)
+        cur.executemany(
+            f"INSERT INTO {table} ({col_sql}) VALUES ({bind_sql}) RETURNING {id_col} INTO :new_id",
+            rows,
+        )
+        return [int(out.getvalue(i)[0]) for i in range(len(rows))]
+    ids = alloc.next_ids(cur, len(rows))
+    cur.executemany(
+        f"INSERT INTO {table} ({id_col}, {col_sql}) VALUES (:new_id, {bind_sql})",
+        [dict(r, new_id=i) for r, i in zip(rows, ids)],
+    )
+    return ids
+
+
+def merge_many_with_ids(cur, alloc, table: str, id_col: str, rows: List[dict], key: str,
+                        exprs: dict = None) -> int:
+    """MERGE em lote: insere só as linhas cuja chave de dedupe (`key`, coluna com índice
+    único) ainda não existe. `exprs` troca o bind de uma coluna por uma expressão SQL
+    (ex.: TO_TIMESTAMP). Retorna quantas linhas foram inseridas."""
+    if not rows:
+        return 0
+    exprs = exprs or {}
+    cols = list(rows[0])
+    src = ", ".join(f"{exprs.get(c, ':' + c)} {c.upper()}" for c in cols)
+    on = f"t.{key.upper()} = s.{key.upper()}"
+    ins_cols = ", ".join(c.upper() for c in cols)
+    ins_vals = ", ".join(f"s.{c.upper()}" for c in cols)
+    if alloc.identity:
+        binds = rows
+        insert = f"INSERT ({ins_cols}) VALUES ({ins_vals})"
+    else:
+        ids = alloc.next_ids(cur, len(rows))
+        binds = [dict(r, new_id=i) for r, i in zip(rows, ids)]
+        insert = f"INSERT ({id_col}, {ins_cols}) VALUES (:new_id, {ins_vals})"
+    cur.executemany(
+        f"MERGE INTO {table} t USING (SELECT {src} FROM DUAL) s ON ({on}) "
+        f"WHEN NOT MATCHED THEN {insert}",
+        binds, arraydmlrowcounts=True,
+    )
+    return sum(cur.getarraydmlrowcounts())
+
+
+# -------------------------------------------------------
+# Contador local para o backend em arquivo (sobrevive a restarts)
+# -------------------------------------------------------
+class FileCounter:
+    """Próximo ID de um CSV guardado num arquivo lateral (<csv>.seq).
+
+    O lateral guarda um teto reservado (próximo ID + reserve), então só é
+    regravado a cada `reserve` IDs. Na recuperação basta ler o lateral e a
+    última linha do CSV; o custo não depende do tamanho do arquivo.
+    """
+
+    def __init__(self, csv_path: str, reserve: int = 100, last_id=None):
+        self.csv_path = csv_path
+        self.seq_path = csv_path + ".seq"
+        self.reserve = reserve
+        self._last_id = last_id or self._last_csv_id  # maior ID já gravado (recuperação)
+        self._next = None
+        self._ceiling = 0
+        self._lock = threading.Lock()
+
+    def _last_csv_id(self) -> int:
+        if not os.path.exists(self.csv_path):
+            return 0
+        if read_header(self.csv_path).split(",")[0] != "id":
+            return 0  # CSV em outro formato (ex.: simulador), sem coluna de id
+        for linha in last_lines(self.csv_path, 1):
+            try:
+                return int(linha.split(",", 1)[0])
+            except ValueError:
+                return 0
+        return 0
+
+    def _recover(self) -> int:
+        # o lateral pode estar atrás do CSV (ex.: lateral apagado), por isso olha a cauda também
+        saved = 1
+        if os.path.exists(self.seq_path):
+            try:
+                with open(self.seq_path, "r", encoding="utf-8") as f:
+                    saved = int(f.read().strip() or 1)
+            except ValueError:
+                saved = 1
+        return max(saved, self._last_id() + 1)
+
+    def _persist(self, value: int):
+        tmp = self.seq_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(value))
+        os.replace(tmp, self.seq_path)
+
+    def next_ids(self, n: int = 1) -> List[int]:
+        with self._lock:
+            if self._next is None:
+                self._next = self._recover()
+                self._ceiling = self._next
+            first = self._next
+            self._next += n
+            if self._next > self._ceiling:
+                # reserva o próximo bloco antes de entregar os IDs (crash só gera lacuna)
+                self._ceiling = self._next + self.reserve
+                self._persist(self._ceiling)
+            return list(range(first, first + n))
+
+    def next_id(self) -> int:
+        return self.next_ids(1)[0]
@@ -0,0 +1,162 @@
+import json
+import queue
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from config import (
+    MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD,
+    MQTT_PUB_QOS, MQTT_PUB_QUEUE_MAX,
+)
+
+# -------------------------------------------------------
+# Publisher MQTT persistente: uma conexão só, reconexão automática
+# (loop_start do paho) e fila de saída. Publicar = enfileirar.
+# -------------------------------------------------------
+_ACKED_CEDO_MAX = 1024   # acks sem mid registrado (ex.: publish que falhou) não acumulam
+
+class MqttPublisher:
+    def __init__(self, qos: int = MQTT_PUB_QOS, max_queue: int = MQTT_PUB_QUEUE_MAX):
+        self.qos = qos
+        self._q = queue.Queue(maxsize=max_queue)
+        self._client = None
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._th = None
+        # Nunca segurar o lock durante client.publish(): o paho chama on_publish com o
+        # mutex de saída dele preso, e o publish() pega esse mesmo mutex (deadlock).
+        self._lock = threading.RLock()
+        self._inflight = {}  # mid → instante do enqueue (latência até o ack do broker)
+        self._acked_cedo = {}  # mid → instante do ack que chegou antes do mid ser registrado
+        self._m = {
+            "enqueued": 0,
+            "dropped": 0,
+            "published": 0,
+            "acked": 0,
+            "errors": 0,
+            "reconnects": 0,
+            "latency_ms_last": 0.0,
+            "latency_ms_max": 0.0,
+            "latency_ms_total": 0.0,
+        }
+
+    # ---- callbacks paho ----
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        print("MQTT publisher conectado:", reason_code)
+        self._connected.set()
+
+    def _on_disconnect(self, client, userdata, *args):
+        self._connected.clear()
+        if not self._stop.is_set():
+            with self._lock:
+                self._m["reconnects"] += 1
+
+    def _on_publish(self, client, userdata, mid, *args):
+        agora = time.perf_counter()
+        with self._lock:
+            t0 = self._inflight.pop(mid, None)
+            if t0 is None:
+                # ack antes de _run registrar o mid: guarda para casar no registro
+                self._acked_cedo[mid] = agora
+                while len(self._acked_cedo) > _ACKED_CEDO_MAX:
+                    self._acked_cedo.pop(next(iter(self._acked_cedo)))
+                return
+            self._conta_ack(t0, agora)
+
+    def _conta_ack(self, t0: float, t_ack: float):
+        """Chamar com o lock."""
+        lat = (t_ack - t0) * 1000
+        self._m["acked"] += 1
+        self._m["latency_ms_last"] = round(lat, 3)
+        self._m["latency_ms_max"] = max(self._m["latency_ms_max"], round(lat, 3))
+        self._m["latency_ms_total"] += lat
+
+    # ---- ciclo de vida ----
+    def start(self):
+        if self._th is not None and self._th.is_alive():
+            return
+        self._stop.clear()
+        client = mqtt.Client()
+        if MQTT_USERNAME and MQTT_PASSWORD:
+            client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_publish = self._on_publish
+        client.reconnect_delay_set(min_delay=1, max_delay=30)
+        client.connect_async(MQTT_BROKER, int(MQTT_PORT), 60)
+        client.loop_start()  # thread de rede do paho: reconecta sozinha
+        self._client = client
+        self._th = threading.Thread(target=self._run, name="mqtt-publisher", daemon=True)
+        self._th.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Espera a fila esvaziar (até `timeout`) antes de desconectar."""
+        deadline = time.monotonic() + timeout
+        while not self._q.empty() and self._connected.is_set() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stop.set()
+        if self._th is not None:
+            self._th.join(timeout=1)
+        if self._client is not None:
+            self._client.disconnect()
+            self._client.loop_stop()
+
+    # ---- produtor ----
+    def publish(self, topic: str, payload, qos: int = None) -> bool:
+        if not isinstance(payload, (str, bytes)):
+            payload = json.dumps(payload)
+        try:
+            self._q.put_nowait((topic, payload, self.qos if qos is None else qos, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._m["dropped"] += 1
+            return False
+        with self._lock:
+            self._m["enqueued"] += 1
+        return True
+
+    # ---- consumidor ----
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._connected.wait(timeout=0.5):
+                continue  # mensagens ficam na fila até reconectar
+            try:
+                topic, payload, qos, t0 = self._q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            info = self._client.publish(topic, payload, qos=qos)   # fora do lock (ver __init__)
+            # QoS>0 sem conexão: o paho guarda a mensagem e reenvia ao reconectar
+            aceito = info.rc == mqtt.MQTT_ERR_SUCCESS or (info.rc == mqtt.MQTT_ERR_NO_CONN and qos > 0)
+            with self._lock:
+                if aceito:
+                    self._m["published"] += 1
+                    # o ack pode ter chegado antes deste registro
+                    t_ack = self._acked_cedo.pop(info.mid, None)
+                    if t_ack is None:
+                        self._inflight[info.mid] = t0
+                    else:
+                        self._conta_ack(t0, t_ack)
+                else:
+                    self._m["errors"] += 1
+            if not aceito:
+                # QoS 0 e a conexão caiu entre o wait e o publish: devolve para a fila
+                try:
+                    self._q.put_nowait((topic, payload, qos, t0))
+                except queue.Full:
+                    with self._lock:
+                        self._m["dropped"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._m)
+            m["inflight"] = len(self._inflight)
+        acked = m["acked"] or 1
+        m["latency_ms_avg"] = round(m.pop("latency_ms_total") / acked, 3)
+        m["backlog"] = self._q.qsize()
+        m["connected"] = self._connected.is_set()
+        m["qos"] = self.qos
+        return m
+
+
+publisher = MqttPublisher()
@@ -1,29 +1,85 @@
 import json
 import threading
+from types import SimpleNamespace
 import paho.mqtt.client as mqtt
-import cx_Oracle
 
 from config import (
-    ORACLE_USER, ORACLE_PWD, ORACLE_DSN,
-    MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD
+    MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD,
+    MQTT_BUFFER_MAX, MQTT_FLUSH_ROWS, MQTT_FLUSH_INTERVAL_S, MQTT_BUFFER_PUT_TIMEOUT_S,
 )
+from services import oracle_pool
+from services.write_buffer import WriteBehindBuffer
+from services.fleet_state import fleet
+from services import anomaly
+from services.detection_filter import detection_filter
+from services.spatial_index import spatial
 
 # Helpers com fallback Oracle → CSV
 from persistence import (
-    save_telemetria_db, save_telemetria_file,
-    save_command_db, save_command_file
+    save_telemetria_batch_db, save_telemetria_batch_file,
+    save_command_batch_db, save_command_batch_file,
+    save_detection_batch_db, save_detection_batch_file,
 )
 
 TOPIC_TEL = "mottu/motos/+/telemetry"
 TOPIC_CMD = "mottu/motos/+/commands"
+TOPIC_DET = "mottu/cameras/+/detections"   # um quadro por mensagem: {source, frame_id, region, boxes: [...]}
 
 def _connect_db():
-    return cx_Oracle.connect(user=ORACLE_USER, password=ORACLE_PWD, dsn=ORACLE_DSN)
+    """Sessão do pool compartilhado (conn.close() devolve ao pool)."""
+    return oracle_pool.acquire()
 
+# -------------------------------------------------------
+# Gravação em lote (thread do buffer, fora do loop do paho)
+# -------------------------------------------------------
+def _flush(batch, save_db, save_file, nome):
+    try:
+        with _connect_db() as conn:
+            cur=conn.cursor()
+            save_db(cur, batch); conn.commit(); cur.close()
+        print(f"✓ (oracle) {len(batch)} {nome}")
+        return "oracle"
+    except Exception as e_db:
+        save_file(batch)
+        print(f"✓ (file) {len(batch)} {nome} | motivo oracle:", e_db)
+        return "file"
+
+def _flush_telemetria(batch):
+    return _flush(batch, save_telemetria_batch_db, save_telemetria_batch_file, "telemetria(s)")
+
+def _flush_comandos(batch):
+    return _flush(batch, save_command_batch_db, save_command_batch_file, "comando(s)")
+
+def _flush_deteccoes(batch):
+    return _flush(batch, save_detection_batch_db, save_detection_batch_file, "detecção(ões)")
+
+_buf_opts = dict(
+    max_queue=MQTT_BUFFER_MAX, flush_rows=MQTT_FLUSH_ROWS,
+    flush_interval_s=MQTT_FLUSH_INTERVAL_S, put_timeout_s=MQTT_BUFFER_PUT_TIMEOUT_S,
+)
+tel_buffer = WriteBehindBuffer("telemetria", _flush_telemetria, **_buf_opts)
+cmd_buffer = WriteBehindBuffer("comandos", _flush_comandos, **_buf_opts)
+det_buffer = WriteBehindBuffer("deteccoes", _flush_deteccoes, **_buf_opts)
+
+def _deteccoes(data: dict):
+    """Mensagem de quadro (com "boxes") ou de uma caixa só → uma detecção por caixa."""
+    boxes = data.get("boxes", [data])
+    return [SimpleNamespace(
+        source=str(data.get("source", "mqtt")), label=str(b["label"]), conf=float(b["conf"]),
+        x=int(b["x"]), y=int(b["y"]), w=int(b["w"]), h=int(b["h"]),
+        frame_id=int(data["frame_id"]) if data.get("frame_id") is not None else None,
+        id_moto=int(b["id_moto"]) if b.get("id_moto") is not None else None,
+        region=b.get("region", data.get("region")),
+    ) for b in boxes]
+
+# -------------------------------------------------------
+# Callbacks MQTT (só parse + enfileiramento, sem I/O)
+# -------------------------------------------------------
 def on_connect(client, userdata, flags, reason_code, properties=None):
     print("MQTT conectado:", reason_code)
     client.subscribe(TOPIC_TEL)
     client.subscribe(TOPIC_CMD)
+    client.subscribe(TOPIC_DET)
 
 def on_message(client, userdata, msg):
     topic = msg.topic
@@ -37,29 +93,35 @@ def on_message(client, userdata, msg):
         if "telemetry" in topic:
             class T:
                 id_moto=int(data["id_moto"]); temp_c=float(data["temp_c"]); vib=float(data["vib"]); batt_pct=float(data["batt_pct"])
-            try:
-                conn=_connect_db(); cur=conn.cursor()
-                new_id=save_telemetria_db(cur, T); conn.commit(); cur.close(); conn.close()
-                print("✓ (oracle) telemetria:", data)
-            except Exception as e_db:
-                save_telemetria_file(T)
-                print("✓ (file) telemetria:", data, "| motivo oracle:", e_db)
+            fleet.update(T.id_moto, T.temp_c, T.vib, T.batt_pct)
+            anomaly.observe(T)
+            tel_buffer.offer(T)  # fila cheia → conta em "dropped" (ver /health/mqtt)
 
         elif "commands" in topic:
             class C:
                 id_moto=int(data["id_moto"]); kind=str(data.get("kind","unknown")); reason=data.get("reason")
-            try:
-                conn=_connect_db(); cur=conn.cursor()
-                new_id=save_command_db(cur, C); conn.commit(); cur.close(); conn.close()
-                print("✓ (oracle) comando:", data)
-            except Exception as e_db:
-                save_command_file(C)
-                print("✓ (file) comando:", data, "| motivo oracle:", e_db)
+            cmd_buffer.offer(C)
+
+        elif "detections" in topic:
+            aceitas, _ = detection_filter.split(_deteccoes(data))
+            spatial.update_many(aceitas)   # posição + id_moto das caixas associadas
+            for d in aceitas:
+                det_buffer.offer(d)
 
     except Exception as e:
         print("✗ Erro no subscriber:", e)
 
+def metrics():
+    return {"telemetria": tel_buffer.metrics(), "comandos": cmd_buffer.metrics(),
+            "deteccoes": det_buffer.metrics()}
+
+_client = None
+
 def run_background():
+    global _client
+    tel_buffer.start()
+    cmd_buffer.start()
+    det_buffer.start()
     client = mqtt.Client()
     if MQTT_USERNAME and MQTT_PASSWORD:
         client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
@@ -68,4 +130,16 @@ def run_background():
     client.connect(MQTT_BROKER, int(MQTT_PORT), 60)
     th = threading.Thread(target=client.loop_forever, daemon=True)
     th.start()
+    _client = client
     return client, th
+
+def stop_background():
+    """Desconecta do broker e grava o que ainda estiver nos buffers."""
+    if _client is not None:
+        try:
+            _client.disconnect()
+        except Exception as e:
+            print("Aviso: falha ao desconectar MQTT:", e)
+    tel_buffer.stop()
+    cmd_buffer.stop()
+    det_buffer.stop()
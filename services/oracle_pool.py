@@ -0,0 +1,223 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import cx_Oracle
+
+from config import (
+    ORACLE_USER, ORACLE_PWD, ORACLE_DSN,
+    ORACLE_POOL_MIN, ORACLE_POOL_MAX, ORACLE_POOL_INCREMENT,
+    ORACLE_POOL_TIMEOUT_MS, ORACLE_POOL_PING_S,
+    ORACLE_BREAKER_FAILURES, ORACLE_BREAKER_RESET_S,
+)
+from services.circuit_breaker import CircuitBreaker
+
+# -------------------------------------------------------
+# Pool de sessões Oracle compartilhado (API + subscriber MQTT)
+# -------------------------------------------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+# contadores simples para /health/oracle
+_stats = {
+    "acquires": 0,
+    "acquire_errors": 0,
+    "acquire_wait_ms_total": 0.0,
+    "acquire_wait_ms_max": 0.0,
+}
+_stats_lock = threading.Lock()
+
+# circuito compartilhado: com o Oracle fora, acquire() falha na hora e quem
+# chama cai direto no fallback em arquivo, sem esperar timeout de conexão
+breaker = CircuitBreaker("oracle", ORACLE_BREAKER_FAILURES, ORACLE_BREAKER_RESET_S)
+
+def init_pool():
+    """Cria o pool (idempotente). Chamado no startup da API ou no 1º acquire."""
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = cx_Oracle.SessionPool(
+                user=ORACLE_USER, password=ORACLE_PWD, dsn=ORACLE_DSN,
+                min=ORACLE_POOL_MIN, max=ORACLE_POOL_MAX, increment=ORACLE_POOL_INCREMENT,
+                threaded=True,
+                getmode=cx_Oracle.SPOOL_ATTRVAL_TIMEDWAIT,
+                wait_timeout=ORACLE_POOL_TIMEOUT_MS,
+                ping_interval=ORACLE_POOL_PING_S,
+            )
+            print(f"Pool Oracle criado (min={ORACLE_POOL_MIN}, max={ORACLE_POOL_MAX}).")
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            try:
+                _pool.close(force=True)
+            finally:
+                _pool = None
+
+# erros de conexão/instância: só estes indicam Oracle fora. ORA-00904/00942 (schema ou
+# SQL errado), constraint etc. são erro da aplicação e não abrem o circuito.
+_ORA_QUEDA = {
+    1012, 1033, 1034, 1089, 1092, 3113, 3114, 3135, 12153, 12170, 12502, 12514,
+    12516, 12519, 12528, 12537, 12541, 12543, 12547, 12560, 12571, 24459,
+}
+_DPI_QUEDA = ("DPI-1010", "DPI-1080")   # não conectado / conexão fechada pelo servidor
+_ORA_RE = re.compile(r"ORA-(\d{5})")
+
+def _falha_do_banco(e: BaseException) -> bool:
+    """Erro que indica banco fora (conexão caiu, instância indisponível)."""
+    if isinstance(e, (cx_Oracle.OperationalError, cx_Oracle.InterfaceError)):
+        return True
+    if not isinstance(e, cx_Oracle.DatabaseError):
+        return False
+    err = e.args[0] if e.args else None
+    if getattr(err, "isrecoverable", False):
+        return True
+    msg = str(getattr(err, "message", err))
+    if msg.startswith(_DPI_QUEDA):
+        return True
+    code = getattr(err, "code", None)
+    if not code:
+        m = _ORA_RE.search(msg)
+        code = int(m.group(1)) if m else None
+    return code in _ORA_QUEDA
+
+
+class _Cursor:
+    """Cursor da sessão: erros do banco em qualquer chamada contam no circuito."""
+    def __init__(self, sessao, cur):
+        self._sessao = sessao
+        self._cur = cur
+
+    def __getattr__(self, name):
+        return self._sessao._vigiar(getattr(self._cur, name))
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cur, name, value)   # ex.: cur.arraysize = 1000
+
+    def __iter__(self):
+        try:
+            yield from self._cur
+        except Exception as e:
+            self._sessao._falha(e)
+            raise
+
+
+class _Sessao:
+    """Sessão do pool que informa o circuito pelo resultado real das operações
+    (execute/commit/...), não só pelo acquire. Ao fechar sem erro do banco conta
+    como sucesso; se era a chamada de teste, a vaga é liberada de qualquer jeito."""
+    def __init__(self, conn, probe: bool):
+        self._conn = conn
+        self._probe = probe
+        self._falhou = False
+        self._fechada = False
+
+    def _falha(self, e: BaseException):
+        if not self._falhou and _falha_do_banco(e):
+            self._falhou = True
+            breaker.record_failure()
+
+    def _vigiar(self, attr):
+        if not callable(attr):
+            return attr
+        def _chamada(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                self._falha(e)
+                raise
+        return _chamada
+
+    def __getattr__(self, name):
+        return self._vigiar(getattr(self._conn, name))
+
+    def cursor(self, *args, **kwargs):
+        return _Cursor(self, self._vigiar(self._conn.cursor)(*args, **kwargs))
+
+    def close(self):
+        if self._fechada:
+            return
+        self._fechada = True
+        try:
+            self._conn.close()
+        finally:
+            if not self._falhou:
+                breaker.record_success()
+            if self._probe:
+                breaker.release_probe()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self._falha(exc)
+        self.close()
+
+
+def acquire():
+    """Pega uma sessão do pool. conn.close() devolve a sessão ao pool.
+    Levanta CircuitOpenError sem tocar no banco enquanto o circuito estiver aberto."""
+    probe = breaker.check()
+    t0 = time.perf_counter()
+    try:
+        conn = init_pool().acquire()
+    except Exception:
+        # pool saturado (todas as sessões ocupadas) não é queda do Oracle
+        if not (_pool is not None and _pool.busy >= _pool.max):
+            breaker.record_failure()
+        if probe:
+            breaker.release_probe()
+        with _stats_lock:
+            _stats["acquire_errors"] += 1
+        raise
+    wait_ms = (time.perf_counter() - t0) * 1000
+    with _stats_lock:
+        _stats["acquires"] += 1
+        _stats["acquire_wait_ms_total"] += wait_ms
+        _stats["acquire_wait_ms_max"] = max(_stats["acquire_wait_ms_max"], wait_ms)
+    return _Sessao(conn, probe)
+
+@contextmanager
+def connection():
+    """with connection() as conn: ... (devolve ao pool ao sair). Um erro do banco
+    dentro do bloco conta como falha no circuito."""
+    with acquire() as conn:
+        yield conn
+
+def ping() -> bool:
+    """Health check: pega uma sessão e faz um round trip leve."""
+    try:
+        with connection() as conn:
+            conn.ping()
+        return True
+    except Exception as e:
+        print("Health check Oracle falhou:", e)
+        return False
+
+def pool_metrics() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    acquires = stats["acquires"] or 1
+    stats["acquire_wait_ms_avg"] = round(stats["acquire_wait_ms_total"] / acquires, 3)
+    pool = _pool
+    stats["breaker"] = breaker.metrics()
+    if pool is None:
+        return {"initialized": False, **stats}
+    return {
+        "initialized": True,
+        "min": pool.min,
+        "max": pool.max,
+        "opened": pool.opened,
+        "busy": pool.busy,
+        "timeout_ms": ORACLE_POOL_TIMEOUT_MS,
+        **stats,
+    }
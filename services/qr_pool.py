@@ -0,0 +1,122 @@
+import io
+import multiprocessing
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Tuple
+
+from config import (
+    QR_DECODE_WORKERS, QR_SCAN_SCALE, QR_UPLOAD_MAX_BYTES, QR_BATCH_MAX_FILES, QR_BATCH_MAX_BYTES,
+)
+from leitor_qrcode import decodificar_arquivo
+
+# -------------------------------------------------------
+# Decodificação de QR Code em lote num pool de processos
+#
+# pyzbar/OpenCV são CPU puro e seguram o GIL em boa parte do tempo, então um
+# lote de fotos decodifica em paralelo de verdade só em processos separados.
+# O pool é criado no primeiro uso e reaproveitado; "spawn" porque a API já tem
+# threads (pool Oracle, MQTT) quando ele nasce. Se um worker morre (segfault do
+# zbar/cv2 numa imagem malformada), o pool quebrado é descartado e recriado.
+# -------------------------------------------------------
+IMAGE_EXT = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff")
+
+_executor = None
+_lock = threading.Lock()
+
+
+def executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=QR_DECODE_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _descarta(ex: ProcessPoolExecutor):
+    """Tira de uso um pool quebrado (se outra thread ainda não trocou)."""
+    global _executor
+    with _lock:
+        if _executor is ex:
+            _executor = None
+    ex.shutdown(wait=False, cancel_futures=True)
+
+
+class LoteGrandeDemais(ValueError):
+    pass
+
+
+class DecodeIndisponivel(RuntimeError):
+    pass
+
+
+def expandir(arquivos: Iterable[Tuple[str, bytes]], max_bytes: int = QR_UPLOAD_MAX_BYTES,
+             max_files: int = QR_BATCH_MAX_FILES, max_total: int = QR_BATCH_MAX_BYTES) -> List[Tuple[str, bytes]]:
+    """Troca cada .zip pelas imagens de dentro ("fotos.zip/IMG_01.jpg"); o resto passa direto.
+    Contra zip bomb, os limites (imagens, bytes por imagem, bytes no total) são conferidos
+    pelo diretório do zip antes de descompactar qualquer coisa, e a leitura de cada entrada
+    é limitada (o tamanho declarado no zip pode mentir). LoteGrandeDemais se passar."""
+    out, total = [], 0
+
+    def _conta(nome: str, n: int):
+        nonlocal total
+        total += n
+        if n > max_bytes:
+            raise LoteGrandeDemais(f"{nome} tem mais de {max_bytes} bytes")
+        if total > max_total:
+            raise LoteGrandeDemais(f"Lote acima de {max_total} bytes descompactados")
+        if len(out) >= max_files:
+            raise LoteGrandeDemais(f"Lote acima de {max_files} imagens")
+
+    for nome, dados in arquivos:
+        if not nome.lower().endswith(".zip"):
+            _conta(nome, len(dados))
+            out.append((nome, dados))
+            continue
+        with zipfile.ZipFile(io.BytesIO(dados)) as z:
+            entradas = [i for i in z.infolist()
+                        if not i.is_dir() and i.filename.lower().endswith(IMAGE_EXT)]
+            if len(out) + len(entradas) > max_files:
+                raise LoteGrandeDemais(f"Lote acima de {max_files} imagens")
+            if total + sum(i.file_size for i in entradas) > max_total:
+                raise LoteGrandeDemais(f"Lote acima de {max_total} bytes descompactados")
+            for info in entradas:
+                nome_img = f"{nome}/{info.filename}"
+                if info.file_size > max_bytes:
+                    raise LoteGrandeDemais(f"{nome_img} tem mais de {max_bytes} bytes")
+                try:
+                    with z.open(info) as f:
+                        img = f.read(max_bytes + 1)
+                except (RuntimeError, NotImplementedError, EOFError, zlib.error) as e:
+                    # entrada criptografada, compressão não suportada ou dados corrompidos
+                    raise zipfile.BadZipFile(f"{nome_img}: {e}") from e
+                _conta(nome_img, len(img))
+                out.append((nome_img, img))
+    return out
+
+
+def decode_many(arquivos: List[Tuple[str, bytes]], scale: float = QR_SCAN_SCALE) -> List[Dict]:
+    """Um resultado por arquivo, na mesma ordem: {"arquivo", "codigos"} ou {"arquivo", "erro"}.
+    Pool quebrado: recria e tenta mais uma vez; quebrou de novo → DecodeIndisponivel."""
+    if not arquivos:
+        return []
+    chunk = max(1, len(arquivos) // (QR_DECODE_WORKERS * 4))
+    for _ in range(2):
+        ex = executor()
+        try:
+            return list(ex.map(decodificar_arquivo, arquivos, [scale] * len(arquivos), chunksize=chunk))
+        except BrokenProcessPool as e:
+            print("⚠️ Pool de decode de QR quebrou (worker morreu), recriando:", e)
+            _descarta(ex)
+    raise DecodeIndisponivel("decode de QR Code indisponível (worker morreu duas vezes)")
+
+
+def shutdown():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,97 @@
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+from config import (
+    QR_CAMERA_SOURCE, QR_SCAN_FPS, QR_SCAN_SCALE, QR_SCAN_ROI, QR_QUEUE_MAX, QR_DEDUPE_S,
+    QR_DECODE_THREADS,
+)
+from leitor_qrcode import QrPipeline, parse_roi
+
+# -------------------------------------------------------
+# Worker de captura de QR Code (headless, em thread própria)
+#
+# Roda o pipeline de leitor_qrcode.py (captura → fila de quadros → decode, com
+# skip adaptativo e dedupe) sobre a câmera, limitado a QR_SCAN_FPS quadros
+# decodificados por segundo, em cima da ROI reduzida. Cada QR novo vira um
+# evento {"dados", "ts"} na fila `events`; o mesmo conteúdo não se repete antes
+# de QR_DEDUPE_S. Se a câmera cai, reabre depois de `reconnect_s`.
+# Nada de janela do OpenCV nem requisição HTTP presa esperando a câmera.
+# -------------------------------------------------------
+_CONTADORES = ("frames_read", "frames_decoded", "frames_dropped", "codes", "duplicates")
+
+
+class QrCaptureWorker:
+    def __init__(self, source: str = QR_CAMERA_SOURCE, fps: float = QR_SCAN_FPS,
+                 scale: float = QR_SCAN_SCALE, roi: str = QR_SCAN_ROI,
+                 queue_max: int = QR_QUEUE_MAX, dedupe_s: float = QR_DEDUPE_S,
+                 workers: int = QR_DECODE_THREADS, reconnect_s: float = 5.0):
+        self.source = source
+        self.fps = fps
+        self.scale = scale
+        self.roi = parse_roi(roi)
+        self.dedupe_s = dedupe_s
+        self.workers = workers
+        self.reconnect_s = reconnect_s
+        self.events: "queue.Queue[dict]" = queue.Queue(maxsize=queue_max)
+        self._pipeline: Optional[QrPipeline] = None
+        self._stop = threading.Event()
+        self._th: Optional[threading.Thread] = None
+        self._m = {"events": 0, "dropped": 0, "camera_errors": 0}
+        self._totais: Dict[str, int] = {}   # contadores dos pipelines já encerrados (reconexões)
+
+    # ---- ciclo de vida ----
+    def start(self):
+        if self._th is not None and self._th.is_alive():
+            return
+        self._stop.clear()
+        self._th = threading.Thread(target=self._run, name="qr-capture", daemon=True)
+        self._th.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._pipeline is not None:
+            self._pipeline.stop()
+        if self._th is not None:
+            self._th.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._th is not None and self._th.is_alive()
+
+    # ---- laço de captura ----
+    def _run(self):
+        vistos: Dict[str, float] = {}   # dedupe sobrevive à reabertura da câmera
+        while not self._stop.is_set():
+            p = QrPipeline(self.source, workers=self.workers, scale=self.scale, roi=self.roi,
+                           dedupe_s=self.dedupe_s, max_fps=self.fps, realtime=True,
+                           vistos=vistos, on_code=lambda dados, ts, idx: self.offer(dados, ts))
+            self._pipeline = p
+            aberta = p.run()
+            self._pipeline = None
+            for k in _CONTADORES:
+                self._totais[k] = self._totais.get(k, 0) + p.m[k]
+            if self._stop.is_set():
+                break
+            self._m["camera_errors"] += 1
+            print(f"❌ Câmera {self.source!r} {'caiu' if aberta else 'indisponível'}; "
+                  f"nova tentativa em {self.reconnect_s:.0f}s")
+            self._stop.wait(self.reconnect_s)
+
+    def offer(self, dados: str, ts: Optional[float] = None) -> bool:
+        """Publica um QR lido na fila (descarta se a fila estiver cheia)."""
+        try:
+            self.events.put_nowait({"dados": dados, "ts": time.time() if ts is None else ts})
+        except queue.Full:
+            self._m["dropped"] += 1
+            return False
+        self._m["events"] += 1
+        return True
+
+    def metrics(self) -> Dict:
+        p = self._pipeline
+        atual = {k: self._totais.get(k, 0) + (p.m[k] if p is not None else 0) for k in _CONTADORES}
+        return {"source": self.source, "running": self.running, "fps": self.fps or None,
+                "scale": self.scale, "roi": self.roi, "skip": p.skip if p is not None else None,
+                "queue": self.events.qsize(), **atual, **self._m}
@@ -0,0 +1,144 @@
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import LOCATION_CELL_PX, LOCATION_MAX_DIST_PX, LOCATION_TTL_S, LOCATION_LABELS
+
+# -------------------------------------------------------
+# Índice espacial da última posição de cada moto, por região (câmera/zona)
+#
+# Cada região tem uma grade de células de LOCATION_CELL_PX pixels; a célula
+# guarda as motos cujo centro da última caixa caiu nela. Atualizar é O(1)
+# (sai de uma célula, entra em outra) e a busca por vizinho olha só as células
+# num raio de LOCATION_MAX_DIST_PX.
+#
+# Caixa com id_moto (ArUco, QR) posiciona a moto direto. Caixa sem id_moto
+# (YOLO) é associada à moto conhecida mais próxima na mesma região, vista há
+# menos de LOCATION_TTL_S e a até LOCATION_MAX_DIST_PX do centro; num mesmo
+# lote cada moto recebe no máximo uma caixa (pares mais próximos primeiro).
+# A caixa associada ganha o id_moto antes de ser gravada.
+# -------------------------------------------------------
+class _Pos:
+    __slots__ = ("id_moto", "region", "cx", "cy", "cell", "det", "t", "associated")
+
+    def __init__(self, id_moto: int):
+        self.id_moto = id_moto
+        self.region: Optional[str] = None
+        self.cx = self.cy = 0.0
+        self.cell: Tuple[int, int] = (0, 0)
+        self.det: dict = {}
+        self.t = 0.0
+        self.associated = False
+
+
+def _centro(d) -> Tuple[float, float]:
+    return d.x + d.w / 2, d.y + d.h / 2
+
+
+class SpatialIndex:
+    def __init__(self, cell_px: float = LOCATION_CELL_PX, max_dist_px: float = LOCATION_MAX_DIST_PX,
+                 ttl_s: float = LOCATION_TTL_S, labels: str = LOCATION_LABELS):
+        self.cell_px = cell_px
+        self.max_dist = max_dist_px
+        self.ttl_s = ttl_s
+        self.labels = frozenset(l.strip().lower() for l in labels.split(",") if l.strip())
+        self._pos: Dict[int, _Pos] = {}
+        self._grid: Dict[str, Dict[Tuple[int, int], Set[int]]] = {}   # região → célula → motos
+        self._lock = threading.Lock()
+        self._m = {"updates": 0, "associated": 0, "unmatched": 0, "ignored": 0}
+
+    def _cell(self, cx: float, cy: float) -> Tuple[int, int]:
+        return int(cx // self.cell_px), int(cy // self.cell_px)
+
+    def _mover(self, id_moto: int, d, cx: float, cy: float, t: float, associated: bool):
+        p = self._pos.get(id_moto)
+        if p is None:
+            self._pos[id_moto] = p = _Pos(id_moto)
+        else:
+            self._grid[p.region][p.cell].discard(id_moto)
+        region = d.region or ""
+        p.region, p.cx, p.cy, p.cell = region, cx, cy, self._cell(cx, cy)
+        p.t, p.associated = t, associated
+        p.det = {"source": d.source, "label": d.label, "conf": d.conf, "x": d.x, "y": d.y,
+                 "w": d.w, "h": d.h, "frame_id": d.frame_id}
+        self._grid.setdefault(region, {}).setdefault(p.cell, set()).add(id_moto)
+
+    def _vizinhos(self, region: str, cx: float, cy: float, t: float, livres) -> List[Tuple[float, int]]:
+        """(distância, id_moto) das motos recentes da região a até max_dist do ponto."""
+        grade = self._grid.get(region)
+        if not grade:
+            return []
+        r = math.ceil(self.max_dist / self.cell_px)
+        i0, j0 = self._cell(cx, cy)
+        out = []
+        for i in range(i0 - r, i0 + r + 1):
+            for j in range(j0 - r, j0 + r + 1):
+                for id_moto in grade.get((i, j), ()):
+                    if id_moto not in livres:
+                        continue
+                    p = self._pos[id_moto]
+                    if t - p.t > self.ttl_s:
+                        continue
+                    dist = math.hypot(p.cx - cx, p.cy - cy)
+                    if dist <= self.max_dist:
+                        out.append((dist, id_moto))
+        return out
+
+    def update_many(self, dets: Iterable, t: Optional[float] = None) -> int:
+        """Aplica um lote (normalmente um quadro). Preenche id_moto nas caixas associadas
+        e devolve quantas foram associadas."""
+        t = time.time() if t is None else t
+        todas = list(dets)
+        dets = [d for d in todas if not self.labels or d.label.lower() in self.labels]
+        with self._lock:
+            self._m["updates"] += len(dets)
+            self._m["ignored"] += len(todas) - len(dets)
+            vistos: Set[int] = set()
+            anonimas = []
+            for d in dets:
+                if d.id_moto is not None:
+                    self._mover(d.id_moto, d, *_centro(d), t, False)
+                    vistos.add(d.id_moto)
+                else:
+                    anonimas.append(d)
+            if not anonimas:
+                return 0
+            livres = self._pos.keys() - vistos
+            pares = []
+            for k, d in enumerate(anonimas):
+                cx, cy = _centro(d)
+                pares.extend((dist, k, id_moto) for dist, id_moto in self._vizinhos(d.region or "", cx, cy, t, livres))
+            pares.sort()
+            usadas, n = set(), 0
+            for dist, k, id_moto in pares:
+                if k in usadas or id_moto in vistos:
+                    continue
+                d = anonimas[k]
+                d.id_moto = id_moto
+                self._mover(id_moto, d, *_centro(d), t, True)
+                usadas.add(k)
+                vistos.add(id_moto)
+                n += 1
+            self._m["associated"] += n
+            self._m["unmatched"] += len(anonimas) - n
+            return n
+
+    def location(self, id_moto: int) -> Optional[dict]:
+        with self._lock:
+            p = self._pos.get(id_moto)
+            if p is None:
+                return None
+            idade = time.time() - p.t
+            return {"id_moto": id_moto, "region": p.region or None, "center": [round(p.cx, 1), round(p.cy, 1)],
+                    "box": dict(p.det), "associated": p.associated,
+                    "ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(p.t)),
+                    "age_s": round(idade, 1), "stale": idade > self.ttl_s}
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {"motos": len(self._pos), "regions": len(self._grid), "cell_px": self.cell_px,
+                    "max_dist_px": self.max_dist, "ttl_s": self.ttl_s, **self._m}
+
+
+spatial = SpatialIndex()
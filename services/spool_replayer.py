@@ -0,0 +1,193 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+from config import SPOOL_REPLAY_BATCH, SPOOL_REPLAY_RATE, SPOOL_REPLAY_INTERVAL_S
+from services import oracle_pool
+
+# -------------------------------------------------------
+# Spool local + replay para o Oracle
+#
+# Os CSVs de fallback (data/*.csv) são o spool: tudo que não entrou no Oracle
+# está lá, em ordem. Um checkpoint (<csv>.ckpt) guarda até que byte o arquivo
+# já foi reenviado. O replayer lê a partir do checkpoint, grava em lote com
+# MERGE (idempotente, pela posição da linha no arquivo) e só então avança o
+# checkpoint, então uma queda no meio do caminho só faz o último lote ser
+# reenviado (e deduplicado).
+# O checkpoint guarda também a identidade do arquivo (hash do primeiro registro):
+# spool truncado ou apagado e recriado volta a ser lido do início, e a chave de
+# dedupe ("<arquivo>:<identidade>:<byte>") não colide com a do arquivo antigo.
+# -------------------------------------------------------
+class Spool:
+    def __init__(self, name: str, path: str, header: List[str], replay_db: Callable):
+        self.name = name
+        self.path = path
+        self.header = header
+        self.replay_db = replay_db          # (cur, rows) -> linhas inseridas
+        self.ckpt_path = path + ".ckpt"
+        self._base = os.path.basename(path)
+        self.offset = 0
+        self.ident = ""                     # hash do primeiro registro ("" = ainda vazio)
+        self.m = {"replayed_rows": 0, "inserted_rows": 0, "batches": 0,
+                  "drain_rows_s": 0.0, "last_error": None, "skipped": None}
+        self._load_ckpt()
+
+    def _load_ckpt(self):
+        if os.path.exists(self.ckpt_path):
+            try:
+                with open(self.ckpt_path, "r", encoding="utf-8") as f:
+                    ck = json.load(f)
+                self.offset = int(ck.get("offset", 0))
+                self.ident = ck.get("ident", "")
+                self.m["replayed_rows"] = int(ck.get("rows", 0))
+            except (ValueError, OSError) as e:
+                print(f"⚠️ Checkpoint inválido em {self.ckpt_path}, recomeçando:", e)
+                self.offset = 0
+
+    def _save_ckpt(self):
+        tmp = self.ckpt_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"offset": self.offset, "ident": self.ident,
+                       "rows": self.m["replayed_rows"], "ts": time.time()}, f)
+        os.replace(tmp, self.ckpt_path)
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def _identidade(self) -> str:
+        """Hash da primeira linha depois do cabeçalho ("" se ainda não há registro)."""
+        try:
+            with open(self.path, "rb") as f:
+                f.readline()
+                primeira = f.readline()
+        except OSError:
+            return ""
+        return hashlib.sha1(primeira).hexdigest()[:12] if primeira.endswith(b"\n") else ""
+
+    def _sincroniza(self):
+        """Arquivo menor que o checkpoint ou com outro primeiro registro: foi truncado ou
+        recriado, então o replay recomeça do início. Só a thread do replayer chama."""
+        ident = self._identidade()
+        if self.size() < self.offset or (self.ident and ident != self.ident):
+            print(f"⚠️ Spool {self.path} truncado ou recriado; replay recomeça do início")
+            self.offset, self.ident = 0, ident
+            self._save_ckpt()
+        elif not self.ident:
+            self.ident = ident   # primeiro registro chegou; vai para o .ckpt no próximo commit
+
+    def depth_bytes(self) -> int:
+        self._sincroniza()
+        return max(0, self.size() - self.offset)
+
+    def read_batch(self, limit: int):
+        """Até `limit` registros completos a partir do checkpoint. Retorna (linhas, bytes).
+        Um registro pode ocupar várias linhas (campo entre aspas com quebra de linha, ex.:
+        `reason`): só fecha quando as aspas estão pareadas. Cada linha leva `_origem` =
+        "<arquivo>:<identidade>:<byte>", a chave de dedupe do replay."""
+        self._sincroniza()
+        with open(self.path, "rb") as f:
+            header_line = f.readline()
+            file_header = next(csv.reader([header_line.decode("utf-8-sig").rstrip("\r\n")]), [])
+            if file_header != self.header:
+                # arquivo em outro formato (ex.: CSV do simulador): não é spool de fallback
+                self.m["skipped"] = "cabeçalho diferente do esperado"
+                return [], 0
+            if self.offset < len(header_line):
+                self.offset = len(header_line)
+            f.seek(self.offset)
+            rows, consumed, registro = [], 0, b""
+            while len(rows) < limit:
+                linha = f.readline()
+                if not linha.endswith(b"\n"):
+                    break  # EOF ou linha ainda sendo escrita
+                registro += linha
+                if registro.count(b'"') % 2:
+                    continue  # aspas abertas: o registro continua na próxima linha
+                if registro.strip():
+                    campos = next(csv.reader(io.StringIO(registro.decode("utf-8"))))
+                    rows.append(dict(zip(self.header, campos),
+                                     _origem=f"{self._base}:{self.ident}:{self.offset + consumed}"))
+                consumed += len(registro)
+                registro = b""
+        return rows, consumed
+
+    def commit(self, n_rows: int, consumed: int, inserted: int):
+        self.offset += consumed
+        self.m["replayed_rows"] += n_rows
+        self.m["inserted_rows"] += inserted
+        self.m["batches"] += 1
+        self._save_ckpt()
+
+    def metrics(self) -> Dict:
+        return {"path": self.path, "offset": self.offset,
+                "depth_bytes": max(0, self.size() - self.offset), **self.m}
+
+
+class SpoolReplayer:
+    def __init__(self, spools: List[Spool], batch: int = SPOOL_REPLAY_BATCH,
+                 rate: float = SPOOL_REPLAY_RATE, interval_s: float = SPOOL_REPLAY_INTERVAL_S):
+        self.spools = spools
+        self.batch = batch
+        self.rate = rate                    # linhas/s (limite para não afogar o Oracle)
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._th = None
+
+    def _replay_once(self, spool: Spool) -> int:
+        rows, consumed = spool.read_batch(self.batch)
+        if not consumed:
+            return 0
+        t0 = time.perf_counter()
+        inserted = 0
+        if rows:
+            with oracle_pool.connection() as conn:
+                cur = conn.cursor()
+                inserted = spool.replay_db(cur, rows)
+                conn.commit()
+                cur.close()
+        spool.commit(len(rows), consumed, inserted)
+        dur = time.perf_counter() - t0
+        spool.m["drain_rows_s"] = round(len(rows) / dur, 1) if dur > 0 else 0.0
+        # rate limit: o lote "custa" len(rows)/rate segundos
+        if self.rate > 0:
+            self._stop.wait(max(0.0, len(rows) / self.rate - dur))
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            pendente = False
+            for spool in self.spools:
+                if self._stop.is_set() or not spool.depth_bytes():
+                    continue
+                try:
+                    if self._replay_once(spool):
+                        pendente = True
+                    spool.m["last_error"] = None
+                except Exception as e:
+                    # Oracle ainda fora: tenta de novo no próximo ciclo, do mesmo checkpoint
+                    spool.m["last_error"] = str(e)
+            if not pendente:
+                self._stop.wait(self.interval_s)
+
+    def start(self):
+        if self._th is not None and self._th.is_alive():
+            return
+        self._stop.clear()
+        self._th = threading.Thread(target=self._run, name="spool-replayer", daemon=True)
+        self._th.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._th is not None:
+            self._th.join(timeout=5)
+
+    def metrics(self) -> Dict:
+        return {s.name: s.metrics() for s in self.spools}
@@ -0,0 +1,50 @@
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# -------------------------------------------------------
+# Agregação de telemetria por janela de tempo (min/max/avg/last por bucket)
+#
+# Usado pelo backend em arquivo de GET /telemetria/aggregate; no Oracle a mesma
+# conta é feita com GROUP BY no banco (persistence.aggregate_telemetria_db).
+# Buckets alinhados à hora local, como o TRUNC do Oracle.
+# -------------------------------------------------------
+BUCKETS = {"1m": 1, "5m": 5, "15m": 15, "1h": 60}   # minutos (divisores de 60)
+METRICS = ("temp_c", "vib", "batt_pct")
+
+
+def bucket_start(ts: np.ndarray, minutes: int) -> np.ndarray:
+    """Início do bucket (epoch) de cada ts, no fuso local."""
+    off = time.localtime().tm_gmtoff
+    step = minutes * 60
+    return (ts + off) // step * step - off
+
+
+def aggregate(ts: np.ndarray, ids: np.ndarray, values: Dict[str, np.ndarray], minutes: int) -> List[Dict]:
+    """ts/ids/values: vetores alinhados (uma posição por leitura, em qualquer ordem).
+    Devolve um dict por bucket, em ordem cronológica."""
+    if len(ts) == 0:
+        return []
+    ts = np.asarray(ts, dtype=np.int64)
+    b = bucket_start(ts, minutes)
+    order = np.lexsort((np.asarray(ids), ts, b))     # por bucket, depois ts, depois id
+    b = b[order]
+    starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+    ends = np.r_[starts[1:], len(b)] - 1
+    counts = ends - starts + 1
+    out = {}
+    for m, v in values.items():
+        v = np.asarray(v, dtype=np.float64)[order]
+        out[m] = {
+            "min": np.minimum.reduceat(v, starts),
+            "max": np.maximum.reduceat(v, starts),
+            "avg": np.add.reduceat(v, starts) / counts,
+            "last": v[ends],
+        }
+    return [
+        {"bucket": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(int(b[s]))),
+         "count": int(counts[i]),
+         **{m: {k: round(float(a[i]), 2) for k, a in out[m].items()} for m in values}}
+        for i, s in enumerate(starts)
+    ]
@@ -0,0 +1,177 @@
+import csv
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# -------------------------------------------------------
+# Índice por moto do CSV de telemetria (sidecar <csv>.idx)
+#
+# Cada linha do CSV vira um registro fixo "<IQq" (id_moto, byte da linha, ts epoch)
+# no .idx. Em memória fica, por moto, o vetor de ts e o de offsets em ordem de
+# gravação (o CSV é append-only e ts é a hora da gravação, então já vem ordenado).
+# Uma consulta faz bisect no intervalo de ts da moto e dá seek só nas linhas do
+# resultado: o custo acompanha o tamanho da resposta, não o do arquivo.
+#
+# sync() indexa só os bytes novos desde a última chamada. Apenas o processo que
+# consulta (a API) carrega e grava o .idx; quem só grava o CSV (subscriber) não
+# toca nele, e as linhas dele entram no próximo sync da API.
+# -------------------------------------------------------
+REC = struct.Struct("<IQq")
+
+def parse_ts(s: str) -> int:
+    return int(datetime.fromisoformat(s.strip()).timestamp())
+
+
+class MotoOffsetIndex:
+    def __init__(self, csv_path: str, moto_col: str = "id_moto", ts_col: str = "ts"):
+        self.csv_path = csv_path
+        self.idx_path = csv_path + ".idx"
+        self.moto_col = moto_col
+        self.ts_col = ts_col
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._by_moto: Dict[int, Tuple[array, array]] = {}
+        self._end = 0           # até que byte do CSV já está indexado
+        self._header: List[str] = []
+        self._n = 0
+
+    def _add(self, id_moto: int, offset: int, ts: int):
+        ts_arr, off_arr = self._by_moto.setdefault(id_moto, (array("q"), array("Q")))
+        ts_arr.append(ts)
+        off_arr.append(offset)
+        self._n += 1
+
+    # ---- carga / atualização ----
+    def _load(self):
+        self._reset()
+        self.loaded = True
+        if not os.path.exists(self.csv_path):
+            return
+        with open(self.csv_path, "rb") as f:
+            linha = f.readline()
+            self._header = next(csv.reader([linha.decode("utf-8-sig").rstrip("\r\n")]), [])
+            self._end = len(linha)
+            if not os.path.exists(self.idx_path):
+                return
+            with open(self.idx_path, "rb") as fi:
+                buf = fi.read()
+            buf = buf[:len(buf) - len(buf) % REC.size]   # registro final incompleto
+            last_off = None
+            for id_moto, off, ts in REC.iter_unpack(buf):
+                self._add(id_moto, off, ts)
+                last_off = off
+            if last_off is not None:
+                f.seek(last_off)
+                self._end = last_off + len(f.readline())
+        if self._end > os.path.getsize(self.csv_path):
+            # CSV truncado/recriado: o índice não vale mais
+            self._rebuild()
+
+    def _rebuild(self):
+        try:
+            os.remove(self.idx_path)
+        except FileNotFoundError:
+            pass
+        self._load()
+
+    def sync(self):
+        """Indexa as linhas completas gravadas desde o último sync."""
+        with self._lock:
+            if not self.loaded or not self._header:
+                self._load()   # 1ª vez, ou o CSV ainda não existia
+            try:
+                size = os.path.getsize(self.csv_path)
+            except OSError:
+                return
+            if size < self._end:
+                self._rebuild()
+            if size <= self._end or not self._header:
+                return
+            if self.moto_col not in self._header or self.ts_col not in self._header:
+                return   # outro formato (ex.: CSV do simulador)
+            i_moto = self._header.index(self.moto_col)
+            i_ts = self._header.index(self.ts_col)
+            novos = bytearray()
+            with open(self.csv_path, "rb") as f:
+                f.seek(self._end)
+                pos = self._end
+                for linha in f:
+                    if not linha.endswith(b"\n"):
+                        break   # linha ainda sendo escrita
+                    off, pos = pos, pos + len(linha)
+                    try:
+                        row = next(csv.reader([linha.decode("utf-8")]))
+                        id_moto, ts = int(row[i_moto]), parse_ts(row[i_ts])
+                    except (StopIteration, IndexError, ValueError):
+                        continue
+                    self._add(id_moto, off, ts)
+                    novos += REC.pack(id_moto, off, ts)
+            self._end = pos
+            if novos:
+                with open(self.idx_path, "ab") as fi:
+                    fi.write(novos)
+
+    # ---- consulta ----
+    def query(self, id_moto: int, ts_from: Optional[int] = None, ts_to: Optional[int] = None,
+              before: Optional[Tuple[float, int]] = None, limit: int = 100) -> List[Dict]:
+        """Linhas da moto com ts_from <= ts < ts_to, mais recente primeiro.
+        before=(ts, id) continua a paginação: só linhas anteriores a esse par."""
+        self.sync()
+        with self._lock:
+            par = self._by_moto.get(id_moto)
+            if par is None:
+                return []
+            ts_arr, off_arr = par
+            lo = bisect_left(ts_arr, ts_from) if ts_from is not None else 0
+            hi = bisect_left(ts_arr, ts_to) if ts_to is not None else len(ts_arr)
+            if before is not None:
+                hi = min(hi, bisect_right(ts_arr, before[0]))
+            header = self._header
+        out: List[Dict] = []
+        with open(self.csv_path, "rb") as f:
+            for i in range(hi - 1, lo - 1, -1):
+                f.seek(off_arr[i])
+                row = dict(zip(header, next(csv.reader([f.readline().decode("utf-8")]))))
+                if before is not None and parse_ts(row[self.ts_col]) == before[0] \
+                        and int(row["id"]) >= before[1]:
+                    continue
+                out.append(row)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def rows_between(self, id_moto: Optional[int] = None, ts_from: Optional[int] = None,
+                     ts_to: Optional[int] = None) -> List[Dict]:
+        """Todas as linhas no intervalo (de uma moto ou da frota), em ordem de gravação."""
+        self.sync()
+        with self._lock:
+            motos = [id_moto] if id_moto is not None else list(self._by_moto)
+            offsets = []
+            for m in motos:
+                par = self._by_moto.get(m)
+                if par is None:
+                    continue
+                ts_arr, off_arr = par
+                lo = bisect_left(ts_arr, ts_from) if ts_from is not None else 0
+                hi = bisect_left(ts_arr, ts_to) if ts_to is not None else len(ts_arr)
+                offsets.extend(off_arr[lo:hi])
+            header = self._header
+        offsets.sort()
+        with open(self.csv_path, "rb") as f:
+            out = []
+            for off in offsets:
+                f.seek(off)
+                out.append(dict(zip(header, next(csv.reader([f.readline().decode("utf-8")])))))
+        return out
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {"path": self.idx_path, "rows": self._n, "motos": len(self._by_moto),
+                    "indexed_bytes": self._end}
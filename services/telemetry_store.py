@@ -0,0 +1,324 @@
+"""Armazenamento binário de telemetria (alternativa ao CSV).
+
+Registros de largura fixa (NumPy structured array, 32 bytes) em segmentos
+append-only, um por dia: data/telemetria_bin/AAAA-MM-DD.bin. A leitura usa
+np.memmap, então consultas e agregações trabalham direto sobre as páginas do
+arquivo, sem parse de texto.
+
+Conversão dos CSVs existentes:
+    python -m services.telemetry_store data/telemetria.csv iot/data/telemetria.csv
+"""
+import csv
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+REC = np.dtype([
+    ("id", "<i8"),
+    ("id_moto", "<i4"),
+    ("temp_c", "<f4"),
+    ("vib", "<f4"),
+    ("batt_pct", "<f4"),
+    ("ts", "<i8"),        # epoch em segundos
+])
+
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+def _day(ts: int) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(int(ts)))
+
+
+def parse_ts(s: str) -> int:
+    """Aceita 'AAAA-MM-DD HH:MM:SS' (persistence) e ISO 'AAAA-MM-DDTHH:MM:SS' (simulador)."""
+    return int(datetime.fromisoformat(s.strip()).timestamp())
+
+
+def fmt_ts(ts: int) -> str:
+    return time.strftime(TS_FMT, time.localtime(int(ts)))
+
+
+class TelemetryStore:
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        os.makedirs(base_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    # ---- segmentos ----
+    def segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.base_dir, "*.bin")))
+
+    def _seg_path(self, day: str) -> str:
+        return os.path.join(self.base_dir, f"{day}.bin")
+
+    def open_segment(self, path: str) -> np.ndarray:
+        """memmap só leitura; ignora um registro final incompleto (queda no meio do write)."""
+        n = os.path.getsize(path) // REC.itemsize
+        if n == 0:
+            return np.empty(0, dtype=REC)
+        return np.memmap(path, dtype=REC, mode="r", shape=(n,))
+
+    # ---- escrita ----
+    def append(self, recs: np.ndarray):
+        """Grava registros já montados (dtype REC), separando por dia."""
+        if len(recs) == 0:
+            return
+        days = np.array([_day(t) for t in recs["ts"]])
+        with self._lock:
+            for day in np.unique(days):
+                with open(self._seg_path(day), "ab") as f:
+                    # registro incompleto no fim (queda no meio do write): corta antes de
+                    # gravar, senão tudo que vier depois fica desalinhado
+                    size = f.seek(0, os.SEEK_END)
+                    if size % REC.itemsize:
+                        f.truncate(size - size % REC.itemsize)
+                    f.write(recs[days == day].tobytes())
+
+    # ---- leitura ----
+    def tail(self, limit: int) -> np.ndarray:
+        """Últimos `limit` registros, mais recente primeiro."""
+        partes, falta = [], limit
+        for path in reversed(self.segments()):
+            if falta <= 0:
+                break
+            seg = self.open_segment(path)
+            partes.append(seg[-falta:][::-1] if falta < len(seg) else seg[::-1])
+            falta -= len(partes[-1])
+        return np.concatenate(partes) if partes else np.empty(0, dtype=REC)
+
+    def query(self, id_moto: Optional[int] = None, ts_from: Optional[int] = None,
+              ts_to: Optional[int] = None) -> np.ndarray:
+        """Filtro vetorizado; segmentos fora do intervalo nem são abertos."""
+        d_from = _day(ts_from) if ts_from is not None else None
+        d_to = _day(ts_to) if ts_to is not None else None
+        partes = []
+        for path in self.segments():
+            day = os.path.basename(path)[:-4]
+            if (d_from and day < d_from) or (d_to and day > d_to):
+                continue
+            seg = self.open_segment(path)
+            mask = np.ones(len(seg), dtype=bool)
+            if id_moto is not None:
+                mask &= seg["id_moto"] == id_moto
+            if ts_from is not None:
+                mask &= seg["ts"] >= ts_from
+            if ts_to is not None:
+                mask &= seg["ts"] < ts_to
+            partes.append(seg[mask])
+        return np.concatenate(partes) if partes else np.empty(0, dtype=REC)
+
+    def latest_per_moto(self) -> np.ndarray:
+        """Último registro de cada moto (para semear o estado da frota)."""
+        vistos, partes = set(), []
+        for path in reversed(self.segments()):
+            seg = self.open_segment(path)[::-1]
+            ids, idx = np.unique(seg["id_moto"], return_index=True)
+            novos = np.array([i not in vistos for i in ids], dtype=bool)
+            if novos.any():
+                partes.append(seg[idx[novos]])
+                vistos.update(ids[novos].tolist())
+        return np.concatenate(partes) if partes else np.empty(0, dtype=REC)
+
+    def last_id(self) -> int:
+        """Maior ID gravado. Dentro de um segmento os IDs crescem, mas convert_csv pode
+        acrescentar a dias antigos, então olha o último registro de cada segmento."""
+        ids = [int(seg["id"][-1]) for seg in map(self.open_segment, self.segments()) if len(seg)]
+        return max(ids, default=0)
+
+
+def to_dicts(recs: np.ndarray) -> List[Dict]:
+    """Mesmo formato de list_telemetria_db/list_telemetria_file."""
+    return [
+        {"id": int(r["id"]), "id_moto": int(r["id_moto"]),
+         "temp_c": round(float(r["temp_c"]), 2), "vib": round(float(r["vib"]), 2),
+         "batt_pct": round(float(r["batt_pct"]), 2), "ts": fmt_ts(r["ts"])}
+        for r in recs
+    ]
+
+
+def build(ids: Iterable[int], payloads, ts: int) -> np.ndarray:
+    payloads = list(payloads)
+    recs = np.empty(len(payloads), dtype=REC)
+    recs["id"] = list(ids)
+    recs["id_moto"] = [p.id_moto for p in payloads]
+    recs["temp_c"] = [p.temp_c for p in payloads]
+    recs["vib"] = [p.vib for p in payloads]
+    recs["batt_pct"] = [p.batt_pct for p in payloads]
+    recs["ts"] = ts
+    return recs
+
+
+# -------------------------------------------------------
+# Spool binário: mesma interface do Spool de CSV (services/spool_replayer.py),
+# checkpoint = (segmento, byte) em <base_dir>/replay.ckpt
+# -------------------------------------------------------
+CKPT_NAME = "replay.ckpt"
+
+class BinarySpool:
+    def __init__(self, name: str, store: TelemetryStore, replay_db):
+        self.name = name
+        self.store = store
+        self.replay_db = replay_db
+        self.ckpt_path = os.path.join(store.base_dir, CKPT_NAME)
+        self.segment, self.offset = "", 0
+        self.m = {"replayed_rows": 0, "inserted_rows": 0, "batches": 0,
+                  "drain_rows_s": 0.0, "last_error": None, "skipped": None}
+        if os.path.exists(self.ckpt_path):
+            try:
+                with open(self.ckpt_path, "r", encoding="utf-8") as f:
+                    ck = json.load(f)
+                self.segment, self.offset = ck.get("segment", ""), int(ck.get("offset", 0))
+                self.m["replayed_rows"] = int(ck.get("rows", 0))
+            except (ValueError, OSError) as e:
+                print(f"⚠️ Checkpoint inválido em {self.ckpt_path}, recomeçando:", e)
+
+    def _pending(self):
+        """Segmentos ainda não totalmente reenviados, com o byte de início de cada um."""
+        for path in self.store.segments():
+            name = os.path.basename(path)
+            if name < self.segment:
+                continue
+            start = self.offset if name == self.segment else 0
+            yield path, name, start
+
+    def depth_bytes(self) -> int:
+        return sum(max(0, os.path.getsize(p) - start) for p, _, start in self._pending())
+
+    def read_batch(self, limit: int):
+        for path, name, start in self._pending():
+            seg = self.store.open_segment(path)
+            first = start // REC.itemsize
+            if first >= len(seg):
+                continue
+            chunk = seg[first:first + limit]
+            self._next = (name, (first + len(chunk)) * REC.itemsize)
+            rows = to_dicts(chunk)
+            for i, r in enumerate(rows, first):
+                r["_origem"] = f"{name}:{i * REC.itemsize}"   # chave de dedupe do replay
+            return rows, len(chunk) * REC.itemsize
+        return [], 0
+
+    def commit(self, n_rows: int, consumed: int, inserted: int):
+        self.segment, self.offset = self._next
+        self.m["replayed_rows"] += n_rows
+        self.m["inserted_rows"] += inserted
+        self.m["batches"] += 1
+        tmp = self.ckpt_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segment": self.segment, "offset": self.offset,
+                       "rows": self.m["replayed_rows"], "ts": time.time()}, f)
+        os.replace(tmp, self.ckpt_path)
+
+    def metrics(self) -> Dict:
+        return {"path": self.store.base_dir, "segment": self.segment, "offset": self.offset,
+                "depth_bytes": self.depth_bytes(), **self.m}
+
+
+# -------------------------------------------------------
+# Conversor CSV → binário
+# -------------------------------------------------------
+SIM_HEADER = ["id_moto", "temp_c", "vib", "batt_pct", "zona", "timestamp"]
+
+def convert_csv(csv_path: str, store: TelemetryStore, counter, chunk: int = 100_000) -> int:
+    """Converte um CSV de telemetria (formato do fallback ou do simulador, com ou sem
+    cabeçalho) para segmentos binários. Retorna quantos registros foram gravados.
+    Rodar com a API parada: o checkpoint do replay pode ser recuado (ver rewind_checkpoint)."""
+    antes = {os.path.basename(p): os.path.getsize(p) for p in store.segments()}
+    total = _convert(csv_path, store, counter, chunk)
+    tocados = {os.path.basename(p): antes.get(os.path.basename(p), 0) for p in store.segments()
+               if os.path.getsize(p) != antes.get(os.path.basename(p))}
+    rewind_checkpoint(store, tocados)
+    return total
+
+
+def rewind_checkpoint(store: TelemetryStore, tocados: Dict[str, int]):
+    """`tocados`: segmento → tamanho antes de receber registros novos. Se algum trecho novo
+    ficou atrás do checkpoint do BinarySpool, o replay pularia esses registros: o checkpoint
+    volta para o primeiro deles. O que já tinha sido reenviado depois desse ponto vai de
+    novo, e o MERGE por SPOOL_ORIGEM descarta (os registros antigos não mudam de byte)."""
+    ckpt_path = os.path.join(store.base_dir, CKPT_NAME)
+    if not tocados or not os.path.exists(ckpt_path):
+        return  # sem checkpoint o replay começa do primeiro segmento
+    with open(ckpt_path, "r", encoding="utf-8") as f:
+        ck = json.load(f)
+    atual = (ck.get("segment", ""), int(ck.get("offset", 0)))
+    inicio = min((name, size - size % REC.itemsize) for name, size in tocados.items())
+    if inicio >= atual:
+        return
+    ck.update(segment=inicio[0], offset=inicio[1], ts=time.time())
+    tmp = ckpt_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(ck, f)
+    os.replace(tmp, ckpt_path)
+    print(f"↩️ Checkpoint do replay recuado de {atual[0]}:{atual[1]} para {inicio[0]}:{inicio[1]}")
+
+
+def _convert(csv_path: str, store: TelemetryStore, counter, chunk: int) -> int:
+    total = 0
+    with open(csv_path, "r", newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return 0
+        if first[0].strip().lstrip("-").replace(".", "", 1).isdigit():
+            header, pending = SIM_HEADER, [first]   # sem cabeçalho: formato do simulador
+        else:
+            header, pending = first, []
+        buf = {k: [] for k in ("id_moto", "temp_c", "vib", "batt_pct", "ts")}
+
+        def flush():
+            nonlocal total
+            n = len(buf["ts"])
+            if not n:
+                return
+            recs = np.empty(n, dtype=REC)
+            recs["id"] = counter.next_ids(n)
+            for k in buf:
+                recs[k] = buf[k]
+                buf[k].clear()
+            store.append(recs)
+            total += n
+
+        for row in _chain(pending, reader):
+            d = dict(zip(header, row))
+            try:
+                valores = {
+                    "ts": parse_ts(d.get("ts") or d.get("timestamp") or ""),
+                    "id_moto": int(d["id_moto"]),
+                    "temp_c": float(d["temp_c"]),
+                    "vib": float(d["vib"]),
+                    "batt_pct": float(d["batt_pct"]),
+                }
+            except (KeyError, ValueError) as e:
+                print("⚠️ Linha ignorada:", row, e)
+                continue
+            for k, v in valores.items():
+                buf[k].append(v)
+            if len(buf["ts"]) >= chunk:
+                flush()
+        flush()
+    return total
+
+
+def _chain(first_rows, reader):
+    yield from first_rows
+    yield from reader
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.getcwd())
+    from persistence import telemetry_store, telemetry_counter
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    store, counter = telemetry_store(), telemetry_counter()
+    for path in sys.argv[1:]:
+        n = convert_csv(path, store, counter)
+        print(f"✅ {n} registros de {path} → {store.base_dir}")
@@ -0,0 +1,55 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# -------------------------------------------------------
+# Cache read-through com TTL para leituras pequenas e frequentes do Oracle
+# (ex.: lista de áreas). Expirado o TTL, a próxima leitura recarrega; se a
+# recarga falhar e houver valor antigo, ele continua servindo (stale) até o
+# banco voltar. Um invalidate() durante a recarga vence: a geração muda e o
+# valor carregado (possivelmente velho) é devolvido mas não entra no cache.
+# -------------------------------------------------------
+class TTLCache:
+    def __init__(self, name: str, ttl_s: float):
+        self.name = name
+        self.ttl_s = ttl_s
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._gen = 0
+        self._m = {"hits": 0, "misses": 0, "stale": 0, "invalidations": 0}
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        agora = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and agora - item[0] < self.ttl_s:
+                self._m["hits"] += 1
+                return item[1]
+            self._m["misses"] += 1
+            gen = self._gen
+        try:
+            valor = loader()
+        except Exception:
+            if item is None:
+                raise
+            with self._lock:
+                self._m["stale"] += 1
+            return item[1]
+        with self._lock:
+            if self._gen == gen:
+                self._data[key] = (time.monotonic(), valor)
+        return valor
+
+    def invalidate(self, key: Hashable = None):
+        """Sem key, limpa tudo."""
+        with self._lock:
+            self._m["invalidations"] += 1
+            self._gen += 1
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {"name": self.name, "ttl_s": self.ttl_s, "keys": len(self._data), **self._m}
@@ -0,0 +1,121 @@
+import queue
+import threading
+import time
+from typing import Callable, List
+
+# -------------------------------------------------------
+# Buffer write-behind: fila limitada + thread que grava em lote
+# (flush por quantidade OU por tempo, o que vier primeiro)
+# -------------------------------------------------------
+class WriteBehindBuffer:
+    def __init__(self, name: str, flush_fn: Callable[[List], str],
+                 max_queue: int = 10000, flush_rows: int = 500,
+                 flush_interval_s: float = 1.0, put_timeout_s: float = 0.0):
+        self.name = name
+        self.flush_fn = flush_fn          # recebe o lote, devolve o backend usado
+        self.flush_rows = flush_rows
+        self.flush_interval_s = flush_interval_s
+        self.put_timeout_s = put_timeout_s
+        self._q = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._th = None
+        self._lock = threading.Lock()
+        self._m = {
+            "enqueued": 0,
+            "overflows": 0,      # vezes em que a fila estava cheia
+            "dropped": 0,        # itens descartados por fila cheia
+            "flushes": 0,
+            "flushed_rows": 0,
+            "flush_errors": 0,   # lotes perdidos (nem Oracle nem arquivo)
+            "last_backend": None,
+            "last_flush_ms": 0.0,
+            "high_water": 0,
+        }
+
+    # ---- lado do produtor (callback do paho): nunca faz I/O ----
+    def offer(self, item) -> bool:
+        try:
+            self._q.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._m["overflows"] += 1
+            try:
+                # backpressure opcional: espera curta por espaço na fila
+                if self.put_timeout_s <= 0:
+                    raise queue.Full
+                self._q.put(item, timeout=self.put_timeout_s)
+            except queue.Full:
+                with self._lock:
+                    self._m["dropped"] += 1
+                return False
+        with self._lock:
+            self._m["enqueued"] += 1
+            self._m["high_water"] = max(self._m["high_water"], self._q.qsize())
+        return True
+
+    # ---- lado do consumidor ----
+    def _take_batch(self) -> List:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(batch) < self.flush_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self) -> List:
+        batch = []
+        while len(batch) < self.flush_rows:
+            try:
+                batch.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List):
+        if not batch:
+            return
+        t0 = time.perf_counter()
+        try:
+            backend = self.flush_fn(batch)
+        except Exception as e:
+            print(f"✗ Buffer {self.name}: lote de {len(batch)} perdido:", e)
+            with self._lock:
+                self._m["flush_errors"] += 1
+            return
+        with self._lock:
+            self._m["flushes"] += 1
+            self._m["flushed_rows"] += len(batch)
+            self._m["last_backend"] = backend
+            self._m["last_flush_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._flush(self._take_batch())
+        # parada: grava o que sobrou na fila
+        batch = self._drain()
+        while batch:
+            self._flush(batch)
+            batch = self._drain()
+
+    def start(self):
+        if self._th is None or not self._th.is_alive():
+            self._stop.clear()
+            self._th = threading.Thread(target=self._run, name=f"flush-{self.name}", daemon=True)
+            self._th.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._th is not None:
+            self._th.join(timeout)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._m)
+        m["queue_depth"] = self._q.qsize()
+        m["queue_max"] = self._q.maxsize
+        return m
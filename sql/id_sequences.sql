@@ -0,0 +1,24 @@
+-- Sequences para ORACLE_ID_STRATEGY=sequence (padrão).
+-- INCREMENT BY precisa ser igual a ORACLE_ID_BLOCK (.env): cada NEXTVAL reserva
+-- um bloco de IDs que a aplicação distribui em memória (hi/lo).
+-- Cada sequence começa depois do maior ID já existente na tabela.
+
+DECLARE
+  PROCEDURE cria_seq(p_seq VARCHAR2, p_tab VARCHAR2, p_col VARCHAR2) IS
+    v_start NUMBER;
+  BEGIN
+    EXECUTE IMMEDIATE 'SELECT NVL(MAX(' || p_col || '),0)+1 FROM ' || p_tab INTO v_start;
+    EXECUTE IMMEDIATE 'CREATE SEQUENCE ' || p_seq ||
+                      ' START WITH ' || v_start || ' INCREMENT BY 50 NOCYCLE';
+  END;
+BEGIN
+  cria_seq('SQ_IOT_TELEMETRIA',  'T_IOT_TELEMETRIA',  'ID');
+  cria_seq('SQ_IOT_ACIONAMENTO', 'T_IOT_ACIONAMENTO', 'ID');
+  cria_seq('SQ_IOT_DETECCAO',    'T_IOT_DETECCAO',    'ID');
+  cria_seq('SQ_IOT_MOTO',        'T_IOT_MOTO',        'ID_MOTO');
+END;
+/
+
+-- ORACLE_ID_STRATEGY=identity: as tabelas precisam ter sido criadas com a coluna
+-- de ID como identity (uma coluna existente não pode ser convertida), ex.:
+--   ID NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY
@@ -0,0 +1,14 @@
+-- Chave de dedupe do replay do fallback (data/*.csv e data/telemetria_bin → Oracle).
+-- Cada linha reenviada leva SPOOL_ORIGEM com a posição dela no spool
+-- ("<arquivo>:<identidade>:<byte>" no CSV, "<segmento>:<byte>" no binário), e o MERGE
+-- do replay casa só por essa coluna: com o índice único é um INDEX UNIQUE SCAN por
+-- linha, em vez de comparar todas as colunas (full scan). Linhas gravadas direto no
+-- Oracle ficam com NULL, que o índice único não indexa nem compara.
+
+ALTER TABLE T_IOT_TELEMETRIA  ADD (SPOOL_ORIGEM VARCHAR2(200));
+ALTER TABLE T_IOT_ACIONAMENTO ADD (SPOOL_ORIGEM VARCHAR2(200));
+ALTER TABLE T_IOT_DETECCAO    ADD (SPOOL_ORIGEM VARCHAR2(200));
+
+CREATE UNIQUE INDEX UX_IOT_TELEMETRIA_SPOOL  ON T_IOT_TELEMETRIA  (SPOOL_ORIGEM);
+CREATE UNIQUE INDEX UX_IOT_ACIONAMENTO_SPOOL ON T_IOT_ACIONAMENTO (SPOOL_ORIGEM);
+CREATE UNIQUE INDEX UX_IOT_DETECCAO_SPOOL    ON T_IOT_DETECCAO    (SPOOL_ORIGEM);
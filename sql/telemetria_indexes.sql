@@ -0,0 +1,13 @@
+-- Índice para o histórico por moto (GET /motos/{id}/telemetria).
+-- A consulta filtra ID_MOTO = :m, faz range em TS e ordena por TS DESC, ID DESC
+-- (paginação por cursor): com (ID_MOTO, TS, ID) o Oracle percorre só o trecho da
+-- moto no intervalo, já na ordem, e para após :lim linhas (sem sort nem full scan).
+
+CREATE INDEX IX_IOT_TELEMETRIA_MOTO_TS ON T_IOT_TELEMETRIA (ID_MOTO, TS, ID);
+
+-- Conferir o plano (esperado: INDEX RANGE SCAN DESCENDING em IX_IOT_TELEMETRIA_MOTO_TS):
+-- EXPLAIN PLAN FOR
+--   SELECT * FROM T_IOT_TELEMETRIA
+--   WHERE ID_MOTO = 1 AND TS >= SYSTIMESTAMP - INTERVAL '1' DAY
+--   ORDER BY TS DESC, ID DESC FETCH FIRST 100 ROWS ONLY;
+-- SELECT * FROM TABLE(DBMS_XPLAN.DISPLAY);
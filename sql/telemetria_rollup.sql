@@ -0,0 +1,32 @@
+-- Rollup de 1 minuto da telemetria (TELEMETRY_ROLLUP=1).
+-- Mantido na mesma transação de cada INSERT em T_IOT_TELEMETRIA (um MERGE por moto
+-- e por lote); GET /telemetria/aggregate passa a ler daqui e re-agrega 5m/15m/1h,
+-- sem varrer a tabela crua.
+
+CREATE TABLE T_IOT_TELEMETRIA_1M (
+  ID_MOTO        NUMBER       NOT NULL,
+  BUCKET         DATE         NOT NULL,
+  N              NUMBER       NOT NULL,
+  SUM_TEMP_C     NUMBER, MIN_TEMP_C   NUMBER, MAX_TEMP_C   NUMBER, LAST_TEMP_C   NUMBER,
+  SUM_VIB        NUMBER, MIN_VIB      NUMBER, MAX_VIB      NUMBER, LAST_VIB      NUMBER,
+  SUM_BATT_PCT   NUMBER, MIN_BATT_PCT NUMBER, MAX_BATT_PCT NUMBER, LAST_BATT_PCT NUMBER,
+  LAST_TS        TIMESTAMP,
+  CONSTRAINT PK_IOT_TELEMETRIA_1M PRIMARY KEY (ID_MOTO, BUCKET)
+);
+
+CREATE INDEX IX_IOT_TELEMETRIA_1M_BUCKET ON T_IOT_TELEMETRIA_1M (BUCKET);
+
+-- Linhas que entram pelo replay do fallback (data/*.csv → Oracle) entram no rollup
+-- pelo próprio TS (só as que o MERGE inseriu). Dados gravados antes de ligar o
+-- TELEMETRY_ROLLUP não estão aqui; para (re)construir um intervalo a partir da tabela crua:
+--
+-- DELETE FROM T_IOT_TELEMETRIA_1M WHERE BUCKET >= :ini AND BUCKET < :fim;
+-- INSERT INTO T_IOT_TELEMETRIA_1M
+-- SELECT ID_MOTO, TRUNC(CAST(TS AS DATE), 'MI'), COUNT(*),
+--        SUM(TEMP_C),   MIN(TEMP_C),   MAX(TEMP_C),   MAX(TEMP_C)   KEEP (DENSE_RANK LAST ORDER BY TS, ID),
+--        SUM(VIB),      MIN(VIB),      MAX(VIB),      MAX(VIB)      KEEP (DENSE_RANK LAST ORDER BY TS, ID),
+--        SUM(BATT_PCT), MIN(BATT_PCT), MAX(BATT_PCT), MAX(BATT_PCT) KEEP (DENSE_RANK LAST ORDER BY TS, ID),
+--        MAX(TS)
+-- FROM T_IOT_TELEMETRIA
+-- WHERE TS >= :ini AND TS < :fim
+-- GROUP BY ID_MOTO, TRUNC(CAST(TS AS DATE), 'MI');
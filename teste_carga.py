@@ -0,0 +1,114 @@
+"""Teste de carga: compara API_IO_MODE=sync x async.
+
+Sobe um uvicorn (1 worker) para cada modo, dispara N requisições concorrentes
+e imprime vazão e latências. Requer `pip install httpx`.
+
+    python teste_carga.py --requests 2000 --concurrency 500
+    python teste_carga.py --url http://127.0.0.1:8000   # só mede um servidor já rodando
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def _payload():
+    return {
+        "id_moto": random.randint(1, 50),
+        "temp_c": round(random.uniform(25, 80), 2),
+        "vib": round(random.uniform(0, 2), 2),
+        "batt_pct": round(random.uniform(5, 100), 1),
+    }
+
+
+async def _carga(url: str, endpoint: str, total: int, concorrencia: int):
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    sem = asyncio.Semaphore(concorrencia)
+    latencias, erros = [], 0
+
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=60) as client:
+        async def uma():
+            nonlocal erros
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    if endpoint == "/telemetria":
+                        r = await client.post(endpoint, json=_payload())
+                    else:
+                        r = await client.get(endpoint)
+                    if r.status_code >= 400:
+                        erros += 1
+                except httpx.HTTPError:
+                    erros += 1
+                latencias.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(uma() for _ in range(total)))
+        dur = time.perf_counter() - t0
+
+    latencias.sort()
+    pct = lambda p: latencias[min(len(latencias) - 1, int(p * len(latencias)))]
+    return {
+        "req/s": round(total / dur, 1),
+        "p50_ms": round(statistics.median(latencias), 1),
+        "p95_ms": round(pct(0.95), 1),
+        "p99_ms": round(pct(0.99), 1),
+        "erros": erros,
+    }
+
+
+def _subir_servidor(modo: str, porta: int):
+    env = dict(os.environ, API_IO_MODE=modo)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(porta), "--workers", "1", "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(60):
+        try:
+            httpx.get(f"http://127.0.0.1:{porta}/", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"servidor ({modo}) não subiu na porta {porta}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="mede só este servidor (não sobe uvicorn)")
+    ap.add_argument("--endpoint", default="/telemetria", help="/telemetria (POST) ou qualquer rota GET")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=500)
+    ap.add_argument("--modes", default="sync,async")
+    ap.add_argument("--port", type=int, default=8100)
+    args = ap.parse_args()
+
+    if args.url:
+        print(args.url, asyncio.run(_carga(args.url, args.endpoint, args.requests, args.concurrency)))
+        return
+
+    resultados = {}
+    for i, modo in enumerate(args.modes.split(",")):
+        porta = args.port + i
+        proc = _subir_servidor(modo, porta)
+        try:
+            resultados[modo] = asyncio.run(
+                _carga(f"http://127.0.0.1:{porta}", args.endpoint, args.requests, args.concurrency)
+            )
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"\n{args.requests} requisições, {args.concurrency} concorrentes em {args.endpoint}")
+    for modo, r in resultados.items():
+        print(f"  {modo:<6} " + "  ".join(f"{k}={v}" for k, v in r.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import pytest
+
+cx_Oracle = pytest.importorskip("cx_Oracle")
+
+from services import oracle_pool
+from services.circuit_breaker import CircuitBreaker, CLOSED, OPEN
+
+
+# -------------------------------------------------------
+# Circuito do pool: só queda do Oracle abre; erro de SQL/schema não.
+# Sessão falsa no lugar da conexão, sem banco.
+# -------------------------------------------------------
+class _Cursor:
+    def __init__(self, erro):
+        self.erro = erro
+
+    def execute(self, *args, **kwargs):
+        raise self.erro
+
+
+class _Conn:
+    def __init__(self, erro):
+        self.erro = erro
+
+    def cursor(self):
+        return _Cursor(self.erro)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = CircuitBreaker("teste", failure_threshold=1, reset_timeout_s=60)
+    monkeypatch.setattr(oracle_pool, "breaker", b)
+    return b
+
+
+def _executa(erro):
+    with pytest.raises(cx_Oracle.DatabaseError):
+        with oracle_pool._Sessao(_Conn(erro), probe=False) as conn:
+            conn.cursor().execute("SELECT SPOOL_ORIGEM FROM T_IOT_TELEMETRIA")
+
+
+def test_ora_00904_nao_abre_circuito(breaker):
+    # ex.: replay do spool antes de aplicar sql/spool_dedupe.sql
+    _executa(cx_Oracle.DatabaseError('ORA-00904: "SPOOL_ORIGEM": invalid identifier'))
+    assert breaker.state == CLOSED
+    assert breaker.metrics()["consecutive_failures"] == 0
+
+
+def test_ora_00942_nao_abre_circuito(breaker):
+    _executa(cx_Oracle.DatabaseError("ORA-00942: table or view does not exist"))
+    assert breaker.state == CLOSED
+
+
+def test_queda_da_conexao_abre_circuito(breaker):
+    _executa(cx_Oracle.DatabaseError("ORA-03113: end-of-file on communication channel"))
+    assert breaker.state == OPEN
+
+
+def test_operational_error_abre_circuito(breaker):
+    _executa(cx_Oracle.OperationalError("DPI-1080: connection was closed by ORA-3113"))
+    assert breaker.state == OPEN